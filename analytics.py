@@ -0,0 +1,232 @@
+"""What students reveal before they guess right, for teachers.
+
+app.py feeds every progress sync through here (only cells revealed for the
+first time, and first correct guesses, see GameStateStore.apply). Two things
+happen with each batch:
+
+- it is added to running NumPy totals, so GET /api/stats/<key> answers from
+  memory: a size x size reveal count per feature, and how many cells students
+  had revealed when they got the animal right;
+- it is queued for the event log. A background thread writes the queue out
+  every `flush_interval` seconds (or sooner when it fills up), so requests
+  never wait on the disk. Log files are tab-separated lines, one event each,
+  named events-<pid>-<time>.log and rotated at `max_file_bytes`. Rotation
+  leaves other live workers' files alone, and a batch that can't be written
+  goes back on the queue for the next flush:
+
+      R  <unix ms>  <sid>  <animal>  <feature>  <cell = r * size + c>
+      S  <unix ms>  <sid>  <animal>  <cells revealed>
+
+The totals are rebuilt once from the logs already on disk, by load() at
+startup (app.warm_up) or else on first use, never just on import.
+"""
+import atexit
+import glob
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "events")
+
+
+class EventLog:
+    """Write-behind, size-rotated append log."""
+
+    def __init__(self, directory=LOG_DIR, max_file_bytes=32 * 1024 * 1024, keep_files=100,
+                 flush_interval=1.0, max_buffer=4096):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.keep_files = keep_files
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._file = None
+        self._write_lock = threading.Lock()
+
+    def append(self, lines):
+        with self._lock:
+            self._buffer.extend(lines)
+            full = len(self._buffer) >= self.max_buffer
+            # Started lazily and per process: a thread started before
+            # gunicorn forks would not exist in the workers
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._file = None
+                threading.Thread(target=self._run, name="event-log", daemon=True).start()
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError:
+                log.exception("could not write the event log")
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        try:
+            with self._write_lock:
+                if self._file is None or self._file.tell() + len(data) > self.max_file_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+        except OSError:
+            with self._lock:
+                # Keep them for the next flush, but not without limit if the disk stays broken
+                self._buffer[:0] = lines
+                del self._buffer[:-self.max_buffer * 16]
+            raise
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"events-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**6:06d}.log"
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._prune()
+
+    def _prune(self):
+        # Oldest first, down to keep_files, but never another live worker's
+        # files: it may be writing to (or pruning) them at the same moment
+        files = []
+        for path in log_files(self.directory):
+            try:
+                files.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        for _, path in sorted(files)[:-self.keep_files]:
+            if not _writer_gone(path):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _writer_gone(path):
+    """True for this process's own files and those of processes that have exited."""
+    try:
+        pid = int(os.path.basename(path).split("-")[1])
+    except (IndexError, ValueError):
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass        # exists, but not ours to signal
+    return False
+
+
+def log_files(directory):
+    return glob.glob(os.path.join(directory, "events-*.log"))
+
+
+class RevealStats:
+    """Running per-animal totals; every query is a lookup."""
+
+    def __init__(self, size, cells):
+        self.size = size
+        # Most cells anyone can reveal: every cell of every feature map
+        self.max_reveals = cells
+        self._heat = {}         # (animal, feature) -> (size, size) int64
+        self._solved = {}       # animal -> int64 counts indexed by cells revealed
+        self._lock = threading.Lock()
+
+    def add(self, reveals, solved):
+        with self._lock:
+            for animal, feature, r, c in reveals:
+                heat = self._heat.get((animal, feature))
+                if heat is None:
+                    heat = self._heat[(animal, feature)] = np.zeros((self.size, self.size), np.int64)
+                heat[r, c] += 1
+            for animal, count in solved:
+                dist = self._solved.get(animal)
+                if dist is None:
+                    dist = self._solved[animal] = np.zeros(self.max_reveals + 1, np.int64)
+                dist[min(count, self.max_reveals)] += 1
+
+    def heatmaps(self, animal, features):
+        with self._lock:
+            return {f: (self._heat[(animal, f)].copy() if (animal, f) in self._heat
+                        else np.zeros((self.size, self.size), np.int64))
+                    for f in features}
+
+    def reveals_until_correct(self, animal):
+        with self._lock:
+            dist = self._solved.get(animal)
+            return np.zeros(0, np.int64) if dist is None else np.trim_zeros(dist, "b")
+
+    def replay(self, directory):
+        """Add the events from existing log files (once, at startup)."""
+        reveals, solved = [], []
+        for path in sorted(log_files(directory), key=os.path.getmtime):
+            with open(path, encoding="utf-8", errors="replace") as fh:
+                for line in fh:
+                    parts = line.rstrip("\n").split("\t")
+                    try:
+                        if parts[0] == "R" and len(parts) == 6:
+                            r, c = divmod(int(parts[5]), self.size)
+                            if 0 <= r < self.size:
+                                reveals.append((parts[3], parts[4], r, c))
+                        elif parts[0] == "S" and len(parts) == 5:
+                            solved.append((parts[3], int(parts[4])))
+                    except ValueError:
+                        continue    # torn last line of a crashed writer
+        self.add(reveals, solved)
+        return len(reveals) + len(solved)
+
+
+class Analytics:
+    def __init__(self, size, cells, directory=LOG_DIR, **log_options):
+        self.size = size
+        self.directory = directory
+        self.log = EventLog(directory, **log_options)
+        self._stats = RevealStats(size, cells)
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Rebuild the totals from the logs on disk; done once, on first use at the latest."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                try:
+                    self._stats.replay(self.directory)
+                except OSError:
+                    log.exception("could not read old event logs")
+                self._loaded = True
+
+    @property
+    def stats(self):
+        self.load()
+        return self._stats
+
+    def record(self, sid, reveals, solved):
+        if not reveals and not solved:
+            return
+        self.stats.add(reveals, solved)
+        now = time.time_ns() // 1_000_000
+        lines = [f"R\t{now}\t{sid}\t{a}\t{f}\t{r * self.size + c}" for a, f, r, c in reveals]
+        lines += [f"S\t{now}\t{sid}\t{a}\t{n}" for a, n in solved]
+        self.log.append(lines)
@@ -1,187 +1,638 @@
-from flask import Flask, render_template, jsonify, request, url_for
+from flask import Flask, Response, render_template, jsonify, request, url_for, make_response, abort, redirect
+import base64
+import io
 import os
+import re
 import json
+import gzip
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import analytics
+import assets
+import bitmaps
+import catalogindex
+import convcore
+import convengine
+import gamestate
+import hints
+import maprender
+import metrics
+from convcore import FM_SIZE
+from registry import registry_from_env
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; we fall back to gzip
+    brotli = None
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
+app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024
+metrics.init_app(app)
 
+# Maps go to the browser as base64 bitmaps (see bitmaps.py); set
+# GUESSANIMAL_PACKED_MAPS=0 to send plain nested lists instead.
+USE_PACKED_WIRE = os.environ.get("GUESSANIMAL_PACKED_MAPS", "1") == "1"
 
-# The same hardcoded maps you used in Tkinter (0/1 - we'll map to colors in the client)
-GIRAFFE_MAPS = {
-    "eye": [
-        [0,0,0,0,1,1,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "ear": [
-        [0,0,0,0,1,0,1,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "leg": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,1,0,1,1,0,0,0],
-        [0,0,0,1,0,1,1,0,0,0],
-        [0,0,0,1,0,1,1,0,0,0],
-    ],
-    "neck": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "arm": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "wing": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ]
-}
 
-BUTTERFLY_MAPS = {
-    "eye": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,1,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "ear": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "leg": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "neck": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,1,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "arm": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "wing": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [1,1,0,0,0,0,0,1,1,0],
-        [1,1,1,1,0,0,1,1,1,0],
-        [0,1,1,1,0,1,1,1,1,0],
-        [0,0,1,1,0,1,1,0,0,0],
-        [0,1,1,1,0,1,1,1,1,0],
-        [0,1,1,1,0,1,1,1,0,0],
-        [0,0,1,0,0,0,1,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ]
+# Animals live in animals/<key>/ (see registry.py). Set
+# GUESSANIMAL_DERIVED_MAPS=1 to ignore their maps.json and use the maps
+# convengine computes from the images instead, or GUESSANIMAL_PACK to load a
+# content pack built by contentpack.py.
+registry = registry_from_env(app.static_folder)
+
+# The rendered index page is the same for every visitor, so we render it once
+# and keep the plain, gzip and brotli bodies around together with their ETags.
+_index_cache = {"version": None}
+_index_lock = threading.Lock()
+
+
+# Grid settings for static/js/app.js, from the shared convcore module
+CONV_CONFIG = {
+    "imgSize": convcore.IMG_SIZE,
+    "filterSize": convcore.FILTER_SIZE,
+    "stride": convcore.STRIDE,
+    "padding": convcore.PADDING,
+    "fmSize": convcore.FM_SIZE,
 }
 
+# Where the live classroom server (rooms.py) listens. Empty means the page's
+# own host on port 8765.
+LIVE_URL = os.environ.get("GUESSANIMAL_LIVE_URL", "")
+
+
+def wire_maps(packed):
+    if USE_PACKED_WIRE:
+        return {"packed": bitmaps.packed_wire(packed, FM_SIZE)}
+    return {"filters": {f: bitmaps.unpack_map(bits, FM_SIZE) for f, bits in packed.items()}}
+
+
+# Fingerprinted, right-sized image variants (see assets.py), built for each
+# image the first time it is shown and after it changes.
+BUILD_URL_PREFIX = "/static/" + assets.BUILD_DIR + "/"
+
+
+def image_url(animal, fmt):
+    # Pack animals come with their variants; the original if there are none
+    variants = animal.variants or assets.variants_for(animal.image, app.static_folder)
+    return url_for('static', filename=variants.get(fmt, animal.image))
+
+
+def map_rev(animal):
+    """Short hash of an animal's maps, so URLs derived from them can be cached for good."""
+    h = hashlib.sha256()
+    for f in convcore.FEATURES:
+        h.update(bitmaps.map_to_bytes(animal.maps.get(f, 0), FM_SIZE))
+    return h.hexdigest()[:12]
+
+
+def animal_entry(animal):
+    return {
+        "name": animal.name,
+        "display": animal.display,
+        "image": image_url(animal, "webp"),
+        "imageFallback": image_url(animal, "png"),
+        "rev": map_rev(animal),
+        **wire_maps(animal.maps)
+    }
+
+
+def build_animal_data():
+    # Only the first animal goes into the page so the game can start straight
+    # away; app.js lists the rest from /api/animals and fetches each one from
+    # /api/animals/<key> when it is picked.
+    for key in registry.keys():
+        animal = registry.get(key)
+        if animal is not None:
+            return {key: animal_entry(animal)}
+    return {}
+
+
+def _build_index_page():
+    # Passed as objects: the template's tojson escapes <, > and & so a name
+    # like "</script>" can't end the script block
+    body = render_template("index.html", animal_data=build_animal_data(),
+                           conv_config=CONV_CONFIG, live_url=LIVE_URL).encode("utf-8")
+    tag = hashlib.sha256(body).hexdigest()[:32]
+
+    variants = {None: (body, tag)}
+    variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), tag + "-gz")
+    if brotli is not None:
+        variants["br"] = (brotli.compress(body, quality=11), tag + "-br")
+    return variants
+
+
+def get_index_page():
+    # Cheap check first; only take the lock when a rebuild is needed
+    registry.refresh()
+    if _index_cache["version"] != registry.version:
+        with _index_lock:
+            version = registry.version
+            if _index_cache["version"] != version:
+                _index_cache["variants"] = _build_index_page()
+                _index_cache["version"] = version
+    return _index_cache["variants"]
+
+
+def pick_encoding(variants):
+    accepted = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in variants and accepted[encoding]:
+            return encoding
+    return None
+
+
 @app.route("/")
 def index():
-    # Pass maps and giraffe URL to the template; client-side JS will handle interactions
-    animal_data = {
-        "animal1": {
-            "name": "giraffe",
-            "display": "Animal 1",
-            "image": url_for('static', filename='images/giraffe.png'),
-            "filters": GIRAFFE_MAPS  
-        },
-        "animal2": {
-            "name": "butterfly",
-            "display": "Animal 2",
-            "image": url_for('static', filename='images/butterfly.png'),
-            "filters": BUTTERFLY_MAPS  
+    # The first animal is inlined in the cached page; client-side JS handles interactions
+    variants = get_index_page()
+    encoding = pick_encoding(variants)
+    body, tag = variants[encoding]
+
+    if request.if_none_match.contains(tag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(body)
+        resp.content_type = "text/html; charset=utf-8"
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(tag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@app.route("/teacher")
+def teacher():
+    # Dashboard for a live classroom room, see rooms.py
+    return render_template("teacher.html", live_url=LIVE_URL)
+
+
+@app.after_request
+def cache_fingerprinted_assets(resp):
+    # Build outputs are named by content hash, so they never change in place
+    if request.path.startswith(BUILD_URL_PREFIX) and resp.status_code == 200:
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
+
+# -------------------------------------------------
+# Animal catalog, fetched by app.js as needed
+# -------------------------------------------------
+
+ANIMALS_PER_PAGE = 50
+ANIMALS_MAX_PER_PAGE = 200
+
+
+def cached_json(doc, max_age=60):
+    """JSON response with a strong ETag; answers If-None-Match with a 304."""
+    body = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+    tag = hashlib.sha256(body).hexdigest()[:32]
+    if request.if_none_match.contains(tag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(body)
+        resp.content_type = "application/json"
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return resp
+
+
+@app.route("/api/animals")
+def animal_list():
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", ANIMALS_PER_PAGE, type=int)
+    if page < 1 or per_page < 1:
+        abort(400, "page and per_page start at 1")
+    per_page = min(per_page, ANIMALS_MAX_PER_PAGE)
+
+    keys = registry.keys()
+    start = (page - 1) * per_page
+    animals = []
+    for key in keys[start:start + per_page]:
+        animal = registry.get(key)
+        if animal is not None:
+            animals.append({"key": key, "display": animal.display})
+
+    next_url = None
+    if start + per_page < len(keys):
+        next_url = url_for("animal_list", page=page + 1, per_page=per_page)
+    return cached_json({"animals": animals, "page": page, "perPage": per_page,
+                        "total": len(keys), "next": next_url})
+
+
+@app.route("/api/animals/<key>")
+def animal_detail(key):
+    animal = registry.get(key)
+    if animal is None:
+        abort(404)
+    return cached_json({"key": key, **animal_entry(animal)})
+
+
+# -------------------------------------------------
+# Feature maps as PNGs, for browsers slow at canvas redraws (see maprender.py)
+# -------------------------------------------------
+
+RENDER_CELL_PX = 17         # app.js's SCALE
+RENDER_MAX_CELL_PX = 40
+FULL_MASK = (1 << FM_SIZE * FM_SIZE) - 1
+
+map_pngs = maprender.PngCache(int(os.environ.get("GUESSANIMAL_RENDER_CACHE_MB", "8")) * 1024 * 1024)
+
+
+@app.route("/api/render/<key>/<feature>/<mask>.png")
+def render_map(key, feature, mask):
+    # mask: the revealed cells, packed (bitmaps.py) and base64url-encoded.
+    # ?v= is the animal's map_rev(), ?s= the cell size in pixels.
+    animal = registry.get(key)
+    if animal is None or feature not in convcore.FEATURES:
+        abort(404)
+    cell = request.args.get("s", RENDER_CELL_PX, type=int)
+    if not 1 <= cell <= RENDER_MAX_CELL_PX:
+        abort(400, f"s goes from 1 to {RENDER_MAX_CELL_PX}")
+    try:
+        bits = bitmaps.map_from_bytes(base64.b64decode(mask + "=" * (-len(mask) % 4), altchars=b"-_", validate=True)) & FULL_MASK
+    except ValueError:
+        abort(400, "bad mask")
+
+    rev = map_rev(animal)
+    if request.args.get("v") != rev:
+        # Missing or old version: send them to the current one, which never changes
+        resp = redirect(url_for("render_map", key=key, feature=feature, mask=mask, v=rev, s=cell))
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+    tag = f"{rev}-{feature}-{bits:x}-{cell}"
+    if request.if_none_match.contains(tag):
+        resp = make_response("", 304)
+    else:
+        cache_key = (key, rev, feature, bits, cell)
+        png = map_pngs.get(cache_key)
+        if png is None:
+            png = maprender.render_png(animal.maps.get(feature, 0), bits, FM_SIZE, cell)
+            map_pngs.put(cache_key, png)
+        resp = make_response(png)
+        resp.content_type = "image/png"
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
+
+@app.route("/api/pipeline/<key>")
+def pipeline(key):
+    # The animal's feature maps pushed through the rest of convcore's mini CNN;
+    # app.js shows it once the animal is guessed
+    animal = registry.get(key)
+    if animal is None:
+        abort(404)
+    maps = [bitmaps.unpack_map(animal.maps.get(f, 0), FM_SIZE) for f in convcore.FEATURES]
+    layers = convcore.pipeline_for((key, animal.signature), maps)
+    specs = {layer["name"]: layer for layer in convcore.DEFAULT_PIPELINE}
+    channels = list(convcore.FEATURES)
+    result = []
+    for name, out in layers:
+        # Pooling keeps the channels, a conv layer names its own
+        channels = specs.get(name, {}).get("features", channels)
+        result.append({"name": name, "shape": list(out.shape), "channels": channels,
+                       "data": out.round(3).tolist()})
+    return jsonify({"layers": result})
+
+
+# -------------------------------------------------
+# Classifying uploaded drawings
+# -------------------------------------------------
+
+CLASSIFY_MAX_FILES = 500
+# Batches bigger than this are split into chunks of this size and spread
+# over a process pool
+CLASSIFY_CHUNK = 32
+
+_classify_pool = None
+_classify_pool_lock = threading.Lock()
+_catalog_cache = {"version": None}
+_catalog_lock = threading.Lock()
+
+
+def classify_pool():
+    # Created on first use so each gunicorn worker gets its own, after forking.
+    # Its processes are started by a forkserver (spawned where there is none),
+    # not forked from a worker whose other threads may hold locks.
+    global _classify_pool
+    if _classify_pool is None:
+        with _classify_pool_lock:
+            if _classify_pool is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["convengine"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                _classify_pool = ProcessPoolExecutor(mp_context=context)
+    return _classify_pool
+
+
+def upload_feature_maps(blobs):
+    if len(blobs) <= CLASSIFY_CHUNK:
+        return convengine.feature_maps_for_blobs(blobs)
+    chunks = [blobs[i:i + CLASSIFY_CHUNK] for i in range(0, len(blobs), CLASSIFY_CHUNK)]
+    hits, ok = [], []
+    for chunk_hits, chunk_ok in classify_pool().map(convengine.feature_maps_for_blobs, chunks):
+        hits.append(chunk_hits)
+        ok.extend(chunk_ok)
+    return np.concatenate(hits), ok
+
+
+def catalog_matrix():
+    """(keys, names, (animals, features*cells) float32 0/1 matrix), rebuilt when the registry changes."""
+    registry.refresh()
+    if _catalog_cache["version"] != registry.version:
+        with _catalog_lock:
+            version = registry.version
+            if _catalog_cache["version"] != version:
+                keys, names, rows = [], [], []
+                for key in registry.keys():
+                    animal = registry.get(key)
+                    if animal is None:
+                        continue
+                    keys.append(key)
+                    names.append(animal.name)
+                    rows.append(np.concatenate([
+                        bitmaps.map_to_array(animal.maps.get(f, 0), FM_SIZE).ravel()
+                        for f in convcore.FEATURES
+                    ]))
+                width = len(convcore.FEATURES) * FM_SIZE * FM_SIZE
+                matrix = np.array(rows, dtype=np.float32).reshape(-1, width)
+                _catalog_cache["data"] = (keys, names, matrix)
+                _catalog_cache["version"] = version
+    return _catalog_cache["data"]
+
+
+def nearest_animals(hits):
+    """Index into the catalog and Hamming distance of the closest animal for each upload."""
+    keys, names, matrix = catalog_matrix()
+    query = hits.reshape(len(hits), -1).astype(np.float32)
+    # |a xor b| = |a| + |b| - 2 a.b, for every (upload, animal) pair at once
+    distances = query.sum(1)[:, None] + matrix.sum(1)[None, :] - 2 * query @ matrix.T
+    best = distances.argmin(axis=1)
+    return best, distances[np.arange(len(hits)), best]
+
+
+# -------------------------------------------------
+# Narrowing down: hints and still-consistent animals
+# -------------------------------------------------
+
+catalog_index = catalogindex.LiveIndex(registry)
+catalog_hints = hints.CatalogHints(catalog_index)
+
+CONSISTENT_LIMIT = 20
+
+
+def parse_masks(body, field):
+    """body[field] as {feature: packed mask (base64, see bitmaps.py)} -> {feature: int}."""
+    revealed = body.get(field, {}) if isinstance(body, dict) else None
+    if not isinstance(revealed, dict):
+        abort(400, f"expected {{\"{field}\": {{feature: mask}}}}")
+    masks = {}
+    try:
+        for feature, text in revealed.items():
+            if feature in convcore.FEATURES:
+                masks[feature] = bitmaps.map_from_b64(text) & ((1 << FM_SIZE * FM_SIZE) - 1)
+    except (TypeError, ValueError):
+        abort(400, "bad mask")
+    return masks
+
+
+@app.route("/api/hint/<key>", methods=["POST"])
+def hint(key):
+    # Body: {"revealed": {feature: mask}}
+    masks = parse_masks(request.get_json(force=True, silent=True), "revealed")
+    try:
+        cell, gain, remaining = catalog_hints.hint(key, masks)
+    except KeyError:
+        abort(404)
+    if cell is None:
+        return jsonify({"cell": None, "remaining": remaining})
+    feature, r, c = cell
+    return jsonify({"cell": {"feature": feature, "r": r, "c": c},
+                    "gain": round(gain, 4), "remaining": remaining})
+
+
+@app.route("/api/consistent", methods=["POST"])
+def consistent_animals():
+    # Body: {"red": {feature: mask}, "blue": {feature: mask}}: the cells seen
+    # as 1 and as 0. Lists the animals that match all of them, or if none
+    # does, the ones that disagree on the fewest.
+    body = request.get_json(force=True, silent=True)
+    red = parse_masks(body, "red")
+    blue = parse_masks(body, "blue")
+    index = catalog_index.get()
+    revealed = {f: red.get(f, 0) | blue.get(f, 0) for f in convcore.FEATURES}
+    cells = index.revealed_cells(revealed)
+    values = np.isin(cells, index.revealed_cells(red))
+
+    found = index.consistent(cells, values)
+    count = index.count(found)
+    result = {"count": count,
+              "animals": [{"key": k, "display": index.displays[index.index[k]]}
+                          for k in index.members(found, CONSISTENT_LIMIT)]}
+    if not count:
+        result["nearest"] = [{"key": k, "display": index.displays[index.index[k]], "distance": d}
+                             for k, d in index.nearest(cells, values)]
+    return jsonify(result)
+
+
+@app.route("/api/classify", methods=["POST"])
+def classify():
+    # multipart/form-data with one or more "images" files
+    files = request.files.getlist("images")
+    if not files:
+        abort(400, "no images uploaded")
+    if len(files) > CLASSIFY_MAX_FILES:
+        abort(413, f"at most {CLASSIFY_MAX_FILES} images per request")
+
+    hits, ok = upload_feature_maps([f.read() for f in files])
+    keys, names, matrix = catalog_matrix()
+    if len(hits) and len(keys):
+        best, distances = nearest_animals(hits)
+
+    results = []
+    i = 0
+    for f, decoded in zip(files, ok):
+        if not decoded:
+            results.append({"filename": f.filename, "error": "not an image"})
+            continue
+        result = {
+            "filename": f.filename,
+            "maps": {feature: bitmaps.map_to_b64(bitmaps.array_to_map(hits[i, j]), FM_SIZE)
+                     for j, feature in enumerate(convcore.FEATURES)},
         }
-    }
-    return render_template("index.html", animal_data=json.dumps(animal_data))
+        if len(keys):
+            result["best"] = {"key": keys[best[i]], "name": names[best[i]],
+                              "distance": int(distances[i])}
+        results.append(result)
+        i += 1
+    return jsonify({"size": FM_SIZE, "results": results})
+
+
+# -------------------------------------------------
+# Streaming the convolution row by row
+# -------------------------------------------------
+
+def feature_row_lines(grid):
+    """JSON documents for a header and then each feature-map row as it is computed."""
+    yield {"size": FM_SIZE, "features": convcore.FEATURES, "stride": convcore.STRIDE,
+           "filterSize": convcore.FILTER_SIZE}
+    for r, responses, hits in convengine.iter_feature_rows(grid):
+        yield {
+            "row": r,
+            "hits": {f: hits[i].astype(int).tolist() for i, f in enumerate(convcore.FEATURES)},
+            "values": {f: responses[i].round(3).tolist() for i, f in enumerate(convcore.FEATURES)},
+        }
+
+
+def stream_rows(grid):
+    # Server-Sent Events if asked for, JSON lines otherwise
+    sse = (request.args.get("format") == "sse"
+           or request.accept_mimetypes.best == "text/event-stream")
+    if sse:
+        body = (f"data: {json.dumps(doc, separators=(',', ':'))}\n\n" for doc in feature_row_lines(grid))
+        mimetype = "text/event-stream"
+    else:
+        body = (json.dumps(doc, separators=(",", ":")) + "\n" for doc in feature_row_lines(grid))
+        mimetype = "application/x-ndjson"
+    resp = Response(body, mimetype=mimetype)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a proxy hold rows back
+    return resp
+
+
+@app.route("/api/stream/<key>")
+def stream_animal(key):
+    animal = registry.get(key)
+    if animal is None:
+        abort(404)
+    try:
+        grid = convengine.load_ink_grid(os.path.join(app.static_folder, animal.image))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        abort(404)
+    return stream_rows(grid)
+
+
+@app.route("/api/stream", methods=["POST"])
+def stream_upload():
+    # multipart/form-data with one "image" file
+    upload = request.files.get("image")
+    if upload is None:
+        abort(400, "no image uploaded")
+    try:
+        grid = convengine.load_ink_grid(io.BytesIO(upload.read()))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        abort(400, "not an image")
+    return stream_rows(grid)
+
+
+# -------------------------------------------------
+# Game progress, synced from the browser as small deltas
+# -------------------------------------------------
+
+game_states = gamestate.GameStateStore()
+
+# Which cells students reveal before guessing right, for teachers (see analytics.py)
+play_stats = analytics.Analytics(
+    FM_SIZE, len(convcore.FEATURES) * FM_SIZE * FM_SIZE,
+    directory=os.environ.get("GUESSANIMAL_EVENT_DIR", analytics.LOG_DIR),
+)
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def check_session_id(sid):
+    if not SESSION_ID_RE.match(sid):
+        abort(400, "bad session id")
+
+
+def parse_reveal(item):
+    animal, feature, r, c = item
+    entry = registry.get(animal) if isinstance(animal, str) else None
+    if (entry is None or feature not in convcore.FEATURES
+            or type(r) is not int or type(c) is not int
+            or not (0 <= r < FM_SIZE and 0 <= c < FM_SIZE)):
+        raise ValueError(item)
+    return entry, feature, r, c
+
+
+def parse_guess(item):
+    animal, text = item
+    entry = registry.get(animal) if isinstance(animal, str) else None
+    if entry is None or not isinstance(text, str):
+        raise ValueError(item)
+    return entry, text
+
+
+@app.route("/api/state/<sid>", methods=["GET"])
+def get_state(sid):
+    # Everything the browser needs to rebuild its maps after a reload
+    check_session_id(sid)
+    snapshot = game_states.snapshot(sid) or {}
+    return jsonify({
+        animal: {
+            "revealed": {f: bitmaps.map_to_b64(mask, FM_SIZE) for f, mask in p["masks"].items()},
+            "correct": p["correct"],
+            "guess": p["guess"],
+        }
+        for animal, p in snapshot.items()
+    })
+
+
+@app.route("/api/state/<sid>", methods=["POST"])
+def post_state(sid):
+    # Body: {"r": [[animal, feature, row, col], ...], "g": [[animal, guess], ...]}
+    check_session_id(sid)
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict):
+        abort(400, "expected a JSON object")
+    try:
+        reveals = [parse_reveal(item) for item in body.get("r", ())]
+        guesses = [parse_guess(item) for item in body.get("g", ())]
+    except (TypeError, ValueError):
+        abort(400, "bad delta")
+    new_reveals, solved = game_states.apply(sid, reveals, guesses)
+    play_stats.record(sid, new_reveals, solved)
+    return "", 204
+
+
+@app.route("/api/stats/<key>")
+def animal_stats(key):
+    # Per feature, how many students revealed each cell; and how many cells
+    # they had revealed when they guessed the animal (index = cells)
+    animal = registry.get(key)
+    if animal is None:
+        abort(404)
+    heat = play_stats.stats.heatmaps(key, animal.maps)
+    until_correct = play_stats.stats.reveals_until_correct(key)
+    return jsonify({
+        "size": FM_SIZE,
+        "reveals": {f: h.tolist() for f, h in heat.items()},
+        "revealsUntilCorrect": until_correct.tolist(),
+        "solved": int(until_correct.sum()),
+    })
+
+
+def warm_up():
+    """The slow part of startup, so the first visitor doesn't pay for it.
 
-"""
+    Called by wsgi.py and `python app.py`, not on import: the classify pool's
+    processes import the main script again, and must not redo all this.
+    """
+    play_stats.load()
+    with app.test_request_context("/"):
+        get_index_page()
 
-# Optional route to return the maps as JSON (unused by this template but available)
-@app.route("/maps.json")
-def maps_json():
-    return jsonify(HARDCODED_MAPS)
-"""
 
 if __name__ == "__main__":
+    warm_up()
     app.run(debug=True)
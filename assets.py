@@ -0,0 +1,127 @@
+"""Right-sized, fingerprinted copies of the animal images.
+
+The originals in static/images are several hundred KB each but are only ever
+drawn into the 510x510 image canvas. build_assets() writes a WebP and a PNG
+resized to that box into static/build, named after the source's content hash
+so they can be cached forever. Byte-identical sources share one set of files.
+
+The app asks variants_for() for one image at a time, the first time it is
+shown. The source is only re-hashed when its mtime or size changes, so that
+is a stat once the variants exist.
+
+    python assets.py      # build them all ahead of time
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+SOURCE_DIR = "images"
+BUILD_DIR = "build"
+
+# The image canvas in index.html is IMG_SIZE * SCALE = 510 px square
+VARIANT_SIZE = 510
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "png": {"format": "PNG", "optimize": True},
+}
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_variant(img, path, options):
+    if options["format"] == "PNG":
+        # A 256-colour palette is plenty for these drawings and ~5x smaller
+        img = img.quantize(256, method=Image.Quantize.FASTOCTREE)
+    # A temp file of our own, so two builders (app workers, contentpack
+    # processes) writing the same variant never share one
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            img.save(fh, **options)
+        os.chmod(tmp_path, 0o644)   # mkstemp makes it owner-only; it is served as is
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_variants(source, outputs, static_dir=STATIC_DIR, size=VARIANT_SIZE):
+    """Write {fmt: path relative to static_dir} resized from source, skipping existing files."""
+    missing = [fmt for fmt, rel in outputs.items()
+               if not os.path.exists(os.path.join(static_dir, rel))]
+    if missing:
+        with Image.open(source) as img:
+            img = img.convert("RGBA").resize((size, size), Image.LANCZOS)
+            for fmt in missing:
+                _write_variant(img, os.path.join(static_dir, outputs[fmt]), FORMATS[fmt])
+
+
+# (source path, size) -> ((mtime, size) of the source, outputs); outputs is {}
+# if the source couldn't be read, so a broken image is only tried (and
+# logged) again once it changes
+_variants = {}
+_by_hash = {}   # (static_dir, digest, size) -> outputs, for byte-identical sources
+
+
+def variants_for(image, static_dir=STATIC_DIR, size=VARIANT_SIZE):
+    """{"webp": "build/..", "png": "build/.."} for image (relative to static_dir),
+    built if missing; {} if it can't be."""
+    source = os.path.join(static_dir, image)
+    try:
+        st = os.stat(source)
+    except OSError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _variants.get((source, size))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    try:
+        digest = file_hash(source)
+        outputs = _by_hash.get((static_dir, digest, size))
+        if outputs is None:
+            stem = os.path.splitext(os.path.basename(image))[0]
+            outputs = {fmt: f"{BUILD_DIR}/{stem}.{digest[:12]}.{size}.{fmt}" for fmt in FORMATS}
+        os.makedirs(os.path.join(static_dir, BUILD_DIR), exist_ok=True)
+        write_variants(source, outputs, static_dir, size)
+        _by_hash[static_dir, digest, size] = outputs
+    except (OSError, ValueError, Image.DecompressionBombError):
+        log.exception("could not build variants of %s, serving the original", source)
+        outputs = {}
+    _variants[source, size] = (stamp, outputs)
+    return outputs
+
+
+def build_assets(static_dir=STATIC_DIR, size=VARIANT_SIZE):
+    """Build missing variants; returns {"images/x.png": {"webp": "build/..", "png": "build/.."}}."""
+    source_dir = os.path.join(static_dir, SOURCE_DIR)
+    manifest = {}
+    for name in sorted(os.listdir(source_dir)):
+        if os.path.splitext(name)[1].lower() not in (".png", ".jpg", ".jpeg", ".webp"):
+            continue
+        outputs = variants_for(f"{SOURCE_DIR}/{name}", static_dir, size)
+        if outputs:
+            manifest[f"{SOURCE_DIR}/{name}"] = outputs
+    return manifest
+
+
+if __name__ == "__main__":
+    for source, outputs in build_assets().items():
+        before = os.path.getsize(os.path.join(STATIC_DIR, source))
+        sizes = ", ".join(
+            f"{rel} ({os.path.getsize(os.path.join(STATIC_DIR, rel)) // 1024} KB)"
+            for rel in outputs.values()
+        )
+        print(f"{source} ({before // 1024} KB) -> {sizes}")
@@ -0,0 +1,513 @@
+"""Microbenchmarks for the Python hot paths.
+
+    python bench.py                      # everything, catalogs of 10 and 1000 animals
+    python bench.py -k index --sizes 10,100000
+    python bench.py --json before.json   # save results to compare against later
+
+Each benchmark is timed over several rounds (each round runs it enough times
+to take ~`--min-time` seconds) and reports the best and median time per call
+plus the peak memory traced while setting it up. Benchmarks that need a
+display (the Tkinter game) are skipped when there is none.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import bitmaps
+from convcore import FEATURES, FM_SIZE, IMG_SIZE
+
+BENCHMARKS = []
+
+
+def benchmark(name, sized=False):
+    """Register fn(size) -> callable. The callable is what gets timed."""
+    def wrap(fn):
+        BENCHMARKS.append((name, sized, fn))
+        return fn
+    return wrap
+
+
+class Skip(Exception):
+    pass
+
+
+# -------------------------------------------------
+# Synthetic catalog
+# -------------------------------------------------
+
+def random_maps(rng, density=0.08):
+    return {f: (rng.random((FM_SIZE, FM_SIZE)) < density).astype(int).tolist() for f in FEATURES}
+
+
+def make_catalog(root, n, seed=0, image="images/giraffe.png"):
+    """Write n fake animals in the animals/<key>/ layout registry.py reads."""
+    rng = np.random.default_rng(seed)
+    for i in range(1, n + 1):
+        folder = os.path.join(root, f"animal{i}")
+        os.makedirs(folder)
+        with open(os.path.join(folder, "meta.json"), "w") as fh:
+            json.dump({"name": f"animal-{i}", "display": f"Animal {i}", "image": image}, fh)
+        with open(os.path.join(folder, "maps.json"), "w") as fh:
+            json.dump(random_maps(rng), fh)
+    return root
+
+
+_catalogs = {}
+
+
+def catalog_dir(n):
+    if n not in _catalogs:
+        _catalogs[n] = make_catalog(tempfile.mkdtemp(prefix=f"ga-catalog-{n}-"), n)
+    return _catalogs[n]
+
+
+def use_catalog(n):
+    """Point app.py at a synthetic catalog of n animals and return the module."""
+    import analytics
+    import app as app_module
+    import catalogindex
+    import hints
+    from registry import AnimalRegistry
+
+    registry = AnimalRegistry(catalog_dir(n), static_dir=app_module.app.static_folder)
+    app_module.registry = registry
+    # Everything else app.py built on the registry, and play stats that log
+    # next to the catalog (the registry skips dot folders) instead of logs/
+    app_module.catalog_index = catalogindex.LiveIndex(registry)
+    app_module.catalog_hints = hints.CatalogHints(app_module.catalog_index)
+    app_module.play_stats = analytics.Analytics(
+        FM_SIZE, len(FEATURES) * FM_SIZE * FM_SIZE, directory=os.path.join(catalog_dir(n), ".events"))
+    app_module._index_cache["version"] = None
+    app_module._catalog_cache["version"] = None
+    return app_module
+
+
+# -------------------------------------------------
+# Web app
+# -------------------------------------------------
+
+@benchmark("index: cached GET /", sized=True)
+def bench_index_cached(n):
+    app_module = use_catalog(n)
+    client = app_module.app.test_client()
+    client.get("/")
+    return lambda: client.get("/", headers={"Accept-Encoding": "gzip"})
+
+
+@benchmark("index: 304 revalidation", sized=True)
+def bench_index_304(n):
+    app_module = use_catalog(n)
+    client = app_module.app.test_client()
+    tag = client.get("/", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    return lambda: client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+
+
+@benchmark("index: full page rebuild", sized=True)
+def bench_index_rebuild(n):
+    app_module = use_catalog(n)
+    app_module.registry.keys()
+
+    def rebuild():
+        with app_module.app.test_request_context("/"):
+            return app_module._build_index_page()
+    return rebuild
+
+
+@benchmark("catalog: GET /api/animals first page", sized=True)
+def bench_animal_list(n):
+    app_module = use_catalog(n)
+    client = app_module.app.test_client()
+    client.get("/api/animals")
+    return lambda: client.get("/api/animals")
+
+
+@benchmark("catalog: GET /api/animals/<key>", sized=True)
+def bench_animal_detail(n):
+    app_module = use_catalog(n)
+    client = app_module.app.test_client()
+    client.get("/api/animals/animal1")
+    return lambda: client.get("/api/animals/animal1")
+
+
+@benchmark("state: apply one click delta")
+def bench_state_delta(_):
+    import gamestate
+    from registry import AnimalRegistry
+
+    animal = AnimalRegistry(catalog_dir(10)).get("animal1")
+    store = gamestate.GameStateStore()
+    deltas = [[(animal, f, r, c)] for f in FEATURES for r in range(FM_SIZE) for c in range(FM_SIZE)]
+    it = iter(range(1 << 62))
+    return lambda: store.apply("s%d" % (next(it) % 1000), deltas[next(it) % len(deltas)])
+
+
+@benchmark("render: feature map PNG, cached")
+def bench_render_cached(_):
+    app_module = use_catalog(10)
+    client = app_module.app.test_client()
+    rev = app_module.map_rev(app_module.registry.get("animal1"))
+    url = f"/api/render/animal1/eye/AwAAAAAAAAAAAAAAAA.png?v={rev}"
+    client.get(url)
+    return lambda: client.get(url)
+
+
+@benchmark("render: feature map PNG, rendered")
+def bench_render_png(_):
+    import maprender
+
+    truth = bitmaps.pack_map(random_maps(np.random.default_rng(9))["eye"])
+    it = iter(range(1 << 62))
+    return lambda: maprender.render_png(truth, next(it) & ((1 << FM_SIZE * FM_SIZE) - 1), FM_SIZE, 17)
+
+
+@benchmark("metrics: record one request")
+def bench_metrics_record(_):
+    import metrics
+
+    m = metrics.Metrics()
+    labels = (("route", "/api/state/<sid>"), ("method", "POST"))
+
+    def record():
+        m.inc("requests_in_flight")
+        m.observe("request_duration_seconds", labels, 0.003)
+        m.observe("response_size_bytes", labels, 0)
+        m.inc("responses_total", labels + (("status", 204),))
+        m.inc("requests_in_flight", value=-1)
+    return record
+
+
+# -------------------------------------------------
+# Maps
+# -------------------------------------------------
+
+@benchmark("maps: pack one 10x10 map")
+def bench_pack_map(_):
+    grid = random_maps(np.random.default_rng(1))["wing"]
+    return lambda: bitmaps.pack_map(grid)
+
+
+@benchmark("maps: convengine compute_feature_maps")
+def bench_convengine(_):
+    import convengine
+
+    grid = np.random.default_rng(2).random((IMG_SIZE, IMG_SIZE)).astype(np.float32)
+    return lambda: convengine.compute_feature_maps(grid)
+
+
+@benchmark("maps: convcore run_pipeline (uncached)")
+def bench_pipeline(_):
+    import convcore
+
+    maps = np.array(list(random_maps(np.random.default_rng(4)).values()))
+    return lambda: convcore.run_pipeline(maps)
+
+
+@benchmark("maps: hint for the next reveal", sized=True)
+def bench_hint(n):
+    import catalogindex
+    import hints
+
+    app_module = use_catalog(n)
+    catalog = hints.CatalogHints(catalogindex.LiveIndex(app_module.registry))
+    masks = {"eye": bitmaps.pack_map([[1] * 3] + [[0] * FM_SIZE] * (FM_SIZE - 1))}
+    catalog.hint("animal1", masks)
+    return lambda: catalog.hint("animal1", masks)
+
+
+@benchmark("maps: consistent animals + nearest", sized=True)
+def bench_consistent(n):
+    import catalogindex
+
+    app_module = use_catalog(n)
+    index = catalogindex.LiveIndex(app_module.registry).get()
+    cells = index.revealed_cells({"eye": bitmaps.pack_map([[1] * 3] + [[0] * FM_SIZE] * (FM_SIZE - 1))})
+    values = index.values_of("animal1", cells)
+
+    def query():
+        found = index.consistent(cells, values)
+        return index.members(found, 20), index.nearest(cells, values)
+    return query
+
+
+@benchmark("maps: registry load of one animal")
+def bench_registry_load(_):
+    from registry import AnimalRegistry
+
+    registry = AnimalRegistry(catalog_dir(10))
+
+    def load():
+        registry._entries.clear()
+        return registry.get("animal1")
+    return load
+
+
+@benchmark("maps: registry load of a content pack", sized=True)
+def bench_pack_load(n):
+    import contentpack
+    from registry import AnimalRegistry
+
+    rng = np.random.default_rng(5)
+    records = [{"key": f"animal{i}", "name": f"animal-{i}", "display": f"Animal {i}",
+                "webp": "build/x.webp", "png": "build/x.png",
+                "maps": bitmaps.pack_maps(random_maps(rng))} for i in range(1, n + 1)]
+    path = os.path.join(catalog_dir(n), "animals.pack")
+    contentpack.write_pack(path, records)
+    return lambda: AnimalRegistry(pack=path)
+
+
+# -------------------------------------------------
+# The game engine, no UI
+# -------------------------------------------------
+
+def engine_game():
+    from engine import GameEngine
+    from registry import AnimalRegistry
+
+    return GameEngine(AnimalRegistry(catalog_dir(10)).get("animal1"))
+
+
+@benchmark("engine: arrow key move")
+def bench_engine_move(_):
+    game = engine_game()
+    game.click(0, 0)
+    moves = [game.move_right] * (FM_SIZE - 1) + [game.move_down] + [game.move_left] * (FM_SIZE - 1) + [game.move_up]
+    it = iter(range(1 << 62))
+    return lambda: moves[next(it) % len(moves)]()
+
+
+@benchmark("engine: 10k random moves")
+def bench_engine_walk(_):
+    # A whole simulated game per call; ops/s x 10k is moves per second
+    game = engine_game()
+    rng = random.Random(6)
+    moves = [rng.choice((game.move_left, game.move_right, game.move_up, game.move_down))
+             for _ in range(10000)]
+
+    def walk():
+        game.click(0, 0)
+        for move in moves:
+            move()
+    return walk
+
+
+@benchmark("engine: replay a 5000-event recording")
+def bench_engine_replay(_):
+    import recording
+    from registry import AnimalRegistry
+
+    # A random session, recorded the way convolutiongame.py --record does
+    path = os.path.join(catalog_dir(10), "session.garc")
+    rng = random.Random(7)
+    recorder = recording.Recorder(path)
+    recorder.animal("animal1")
+    recorder.click(0, 0)
+    for _ in range(5000):
+        k = rng.random()
+        if k < 0.05:
+            recorder.feature(rng.choice(FEATURES))
+        elif k < 0.1:
+            recorder.click(rng.randrange(IMG_SIZE), rng.randrange(IMG_SIZE))
+        else:
+            recorder.move(*rng.choice(((0, -1), (0, 1), (-1, 0), (1, 0))))
+    recorder.close()
+    events = recording.read_recording(path)[1]
+    registry = AnimalRegistry(catalog_dir(10))
+    # A fresh game per call, as `recording.py replay --repeat` does
+    return lambda: recording.replay(events, recording.EngineTarget(registry))
+
+
+# -------------------------------------------------
+# Tkinter game, driven without a visible window
+# -------------------------------------------------
+
+def headless_game(renderer="canvas"):
+    import tkinter as tk
+    import convolutiongame
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise Skip(f"no display ({e})")
+    root.withdraw()
+    return root, convolutiongame.ConvolutionGame(root, renderer=renderer)
+
+
+class FakeEvent:
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+
+@benchmark("game: click reveal + redraw")
+def bench_game_click(_):
+    root, game = headless_game()
+    return random_clicks(root, game)
+
+
+@benchmark("game: click reveal + redraw (raster)")
+def bench_game_click_raster(_):
+    root, game = headless_game("raster")
+    return random_clicks(root, game)
+
+
+def random_clicks(root, game):
+    rng = random.Random(3)
+    events = [FakeEvent(*game.img_grid.point_of(rng.randrange(IMG_SIZE), rng.randrange(IMG_SIZE)))
+              for _ in range(1000)]
+    it = iter(range(1 << 62))
+
+    def click():
+        game.handle_image_click(events[next(it) % len(events)])
+        root.update_idletasks()
+    return click
+
+
+@benchmark("game: click with every cell revealed")
+def bench_game_click_full(_):
+    # Should cost the same as a click on an empty map: only one cell is repainted
+    from convolutiongame import STRIDE
+
+    root, game = headless_game()
+    for f in FEATURES:
+        game.select_feature(f)
+        for r in range(FM_SIZE):
+            for c in range(FM_SIZE):
+                game.handle_image_click(FakeEvent(*game.img_grid.point_of(r * STRIDE, c * STRIDE)))
+    return random_clicks(root, game)
+
+
+@benchmark("game: start up, canvas renderer")
+def bench_game_start_canvas(_):
+    import tkinter as tk
+    import convolutiongame
+
+    root, _ = headless_game()
+
+    def start():
+        frame = tk.Toplevel(root)
+        convolutiongame.ConvolutionGame(frame, renderer="canvas")
+        frame.destroy()
+    return start
+
+
+@benchmark("game: start up, raster renderer")
+def bench_game_start_raster(_):
+    import tkinter as tk
+    import convolutiongame
+
+    root, _ = headless_game()
+
+    def start():
+        frame = tk.Toplevel(root)
+        convolutiongame.ConvolutionGame(frame, renderer="raster")
+        frame.destroy()
+    return start
+
+
+@benchmark("grid: raster viewport of a 300x300 grid, zoomed in")
+def bench_raster_view(_):
+    import gridview
+    from engine import COLORS
+
+    values = np.random.default_rng(8).integers(0, 3, (300, 300), dtype=np.uint8)
+    rgb = np.array([(255, 255, 255), (0, 0, 255), (255, 0, 0)], dtype=np.uint8)
+    line = np.array((128, 128, 128), dtype=np.uint8)
+    assert len(COLORS) == len(rgb)
+    # 600x600 viewport with 8 px cells somewhere in the middle: 75x75 cells drawn
+    return lambda: gridview.render_view(values, rgb, 8, 1000, 1200, 600, 600, line, rgb[0])
+
+
+@benchmark("game: arrow key move")
+def bench_game_move(_):
+    root, game = headless_game()
+    game.handle_image_click(FakeEvent(1, 1))
+    moves = [game.move_right] * (FM_SIZE - 1) + [game.move_down] + [game.move_left] * (FM_SIZE - 1) + [game.move_up]
+    it = iter(range(1 << 62))
+
+    def move():
+        moves[next(it) % len(moves)](None)
+        root.update_idletasks()
+    return move
+
+
+# -------------------------------------------------
+
+def measure(fn, rounds, min_time):
+    # Calibrate: how many calls make one round last about min_time?
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    times = [elapsed / number]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return min(times), statistics.median(times)
+
+
+def fmt_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.0f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", default="10,1000", help="catalog sizes for sized benchmarks")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    results = []
+    print(f"{'benchmark':45} {'animals':>8} {'best':>11} {'median':>11} {'ops/s':>11} {'setup peak':>11}")
+    try:
+        for name, sized, setup in BENCHMARKS:
+            if args.k not in name:
+                continue
+            for n in (sizes if sized else [None]):
+                tracemalloc.start()
+                try:
+                    fn = setup(n)
+                except Skip as e:
+                    tracemalloc.stop()
+                    print(f"{name:45} {'':>8} skipped: {e}")
+                    break
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                best, median = measure(fn, args.rounds, args.min_time)
+                results.append({"name": name, "animals": n, "best": best, "median": median,
+                                "setup_peak_bytes": peak})
+                print(f"{name:45} {n or '':>8} {fmt_time(best)} {fmt_time(median)} "
+                      f"{1 / best:11.0f} {peak / 1e6:8.1f} MB")
+    finally:
+        for path in _catalogs.values():
+            shutil.rmtree(path, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"python": sys.version, "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compact 0/1 feature maps.
+
+A size x size map is stored as a single Python int: cell (r, c) is bit
+r * size + c. For the wire the int is written out little-endian in
+ceil(size*size / 8) bytes and base64-encoded, which static/js/app.js decodes
+back into nested arrays (see decodePackedMap). A 10x10 map is 13 bytes / 20
+base64 characters instead of ~200 characters of nested JSON.
+"""
+import base64
+
+import numpy as np
+
+
+def pack_map(grid):
+    """Nested list of 0/1 (or bools) -> int."""
+    bits = 0
+    i = 0
+    for row in grid:
+        for v in row:
+            if v:
+                bits |= 1 << i
+            i += 1
+    return bits
+
+
+def unpack_map(bits, size):
+    """int -> size x size nested list of 0/1."""
+    return [[(bits >> (r * size + c)) & 1 for c in range(size)] for r in range(size)]
+
+
+def bit_at(bits, size, r, c):
+    return (bits >> (r * size + c)) & 1
+
+
+def map_nbytes(size):
+    return (size * size + 7) // 8
+
+
+def map_to_bytes(bits, size):
+    return bits.to_bytes(map_nbytes(size), "little")
+
+
+def map_from_bytes(data):
+    return int.from_bytes(data, "little")
+
+
+def map_to_b64(bits, size):
+    return base64.b64encode(map_to_bytes(bits, size)).decode("ascii")
+
+
+def map_from_b64(text):
+    # validate: junk raises ValueError instead of decoding to some other map
+    return map_from_bytes(base64.b64decode(text, validate=True))
+
+
+def pack_maps(maps):
+    """{feature: nested list} -> {feature: int}"""
+    return {f: pack_map(grid) for f, grid in maps.items()}
+
+
+def packed_wire(packed, size):
+    """{feature: int} -> the JSON-able form app.js understands."""
+    return {"size": size, "maps": {f: map_to_b64(bits, size) for f, bits in packed.items()}}
+
+
+def map_to_array(bits, size):
+    """int -> (size, size) bool array."""
+    raw = np.frombuffer(map_to_bytes(bits, size), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder="little")[:size * size].reshape(size, size).astype(bool)
+
+
+def array_to_map(arr):
+    """(size, size) bool array -> int."""
+    return map_from_bytes(np.packbits(np.asarray(arr, dtype=bool).ravel(), bitorder="little").tobytes())
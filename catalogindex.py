@@ -0,0 +1,128 @@
+"""Which animals are still consistent with what a student has revealed.
+
+CatalogIndex is an inverted index over the whole catalog, keyed by cell
+(feature, r, c): for each of the features * size * size cells it keeps a
+bitset over all animals, packed into uint64 words, with the animals that
+have a 1 there. The animals with a 0 are the complement, so (cell, value)
+lookups need no second table. The animals consistent with a set of revealed
+cells are the AND of those bitsets.
+
+When nothing is consistent (a mistaken reveal, an animal that isn't in the
+catalog) nearest() falls back to the animals that disagree on the fewest
+revealed cells. For that each animal's maps are also kept as one packed row,
+so the Hamming distance to every animal is an XOR, AND and popcount over the
+whole table.
+
+    catalog = LiveIndex(registry)
+    index = catalog.get()
+    cells = index.revealed_cells(masks)            # {feature: revealed mask}
+    found = index.consistent(cells, values)        # values: 0/1 per cell
+    index.members(found)                           # -> ["animal1", ...]
+"""
+import threading
+
+import numpy as np
+
+import bitmaps
+from convcore import FEATURES, FM_SIZE
+
+
+def _pack_bits(matrix):
+    """(rows, bits) bool -> (rows, words) uint64, bit j of a row is column j."""
+    words = max(1, (matrix.shape[1] + 63) // 64)
+    packed = np.zeros((matrix.shape[0], words * 8), dtype=np.uint8)
+    packed[:, :(matrix.shape[1] + 7) // 8] = np.packbits(matrix, axis=1, bitorder="little")
+    return packed.view("<u8")
+
+
+class CatalogIndex:
+    def __init__(self, animals, features=FEATURES, size=FM_SIZE):
+        self.keys = [a.key for a in animals]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.displays = [a.display for a in animals]
+        self.features = list(features)
+        self.size = size
+        self.cells = size * size
+
+        matrix = np.zeros((len(self.keys), len(self.features) * self.cells), dtype=bool)
+        for i, animal in enumerate(animals):
+            matrix[i] = np.concatenate([
+                bitmaps.map_to_array(animal.maps.get(f, 0), size).ravel() for f in self.features
+            ])
+        # columns[cell] bit i == animal i's value at cell (the inverted index)
+        self.columns = _pack_bits(matrix.T)
+        # rows[i] bit cell == the same, one row per animal (for Hamming distances)
+        self.rows = _pack_bits(matrix)
+        self.everyone = _pack_bits(np.ones((1, len(self.keys)), dtype=bool))[0]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    # -------------------------------------------------
+
+    def revealed_cells(self, masks):
+        """{feature: mask} -> flat cell indices, feature-major."""
+        cells = [np.flatnonzero(bitmaps.map_to_array(masks[f], self.size)) + i * self.cells
+                 for i, f in enumerate(self.features) if masks.get(f)]
+        return np.concatenate(cells) if cells else np.zeros(0, dtype=np.intp)
+
+    def values_of(self, key, cells):
+        """key's own 0/1 values at cells, i.e. what a student playing it has seen."""
+        i = self.index[key]
+        return ((self.columns[cells, i >> 6] >> np.uint64(i & 63)) & np.uint64(1)).astype(bool)
+
+    def consistent(self, cells, values):
+        """Bitset of the animals with `values` at `cells`."""
+        rows = self.columns[cells]
+        if not len(rows):
+            return self.everyone
+        # Where the value is 0 the animals with a 0 agree: AND with ~row
+        flip = np.where(np.asarray(values, dtype=bool), np.uint64(0), ~np.uint64(0))
+        return np.bitwise_and.reduce(rows ^ flip[:, None], axis=0) & self.everyone
+
+    def count(self, bitset):
+        return int(np.bitwise_count(bitset).sum())
+
+    def members(self, bitset, limit=None):
+        """Keys of the animals in bitset, in catalog order."""
+        found = np.flatnonzero(np.unpackbits(bitset.view(np.uint8), bitorder="little")[:len(self.keys)])
+        return [self.keys[i] for i in found[:limit]]
+
+    def nearest(self, cells, values, k=3):
+        """[(key, cells that disagree), ...] for the k closest animals on the revealed cells."""
+        mask = np.zeros(self.rows.shape[1] * 64, dtype=bool)
+        mask[cells] = True
+        target = np.zeros_like(mask)
+        target[cells] = values
+        mask, target = _pack_bits(mask[None])[0], _pack_bits(target[None])[0]
+        distances = np.bitwise_count((self.rows ^ target) & mask).sum(axis=1)
+        k = min(k, len(self.keys))
+        best = np.argpartition(distances, k - 1)[:k] if k else []
+        best = sorted(best, key=lambda i: (distances[i], i))
+        return [(self.keys[i], int(distances[i])) for i in best]
+
+
+class LiveIndex:
+    """A CatalogIndex over a registry's animals, rebuilt when the registry changes."""
+
+    def __init__(self, registry, features=FEATURES, size=FM_SIZE):
+        self.registry = registry
+        self.features = features
+        self.size = size
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        self.registry.refresh()
+        if self._version != self.registry.version:
+            with self._lock:
+                version = self.registry.version
+                if self._version != version:
+                    animals = [a for a in map(self.registry.get, self.registry.keys()) if a is not None]
+                    self._index = CatalogIndex(animals, self.features, self.size)
+                    self._version = version
+        return self._index
@@ -0,0 +1,288 @@
+"""Binary content packs: a whole animal catalog in one file.
+
+    python contentpack.py build content/ animals.pack    # only rebuilds what changed
+    python contentpack.py build content/ animals.pack --force --workers 8
+    GUESSANIMAL_PACK=animals.pack gunicorn -c gunicorn.conf.py
+
+The source folder has one folder per animal:
+
+    content/<key>/meta.json          {"name": "zebra", "display": "Animal 3"}
+    content/<key>/image.png          (or .jpg / .jpeg / .webp)
+    content/<key>/maps.json          optional, the maps as in animals/
+    content/<key>/masks/<feature>.png
+                                     optional part masks, white where the part is
+
+The maps come from maps.json if there is one, else from the part masks (a
+feature map cell is 1 when its filter window covers any of the part), else
+convengine derives them from the image. The image is resized into
+static/build by assets.write_variants().
+
+A hash of each animal's files is kept in <pack>.manifest.json next to the
+results, so a rebuild only redoes the animals whose files changed. Those are
+built in parallel over a process pool. The pack itself is rewritten whole,
+which is cheap: it is just the manifest's results in binary.
+
+Pack layout (little-endian):
+
+    b"GAPK" u16 version  u8 size  u8 n_features  n_features x str
+    u32 n_animals  n_animals x (str key, str name, str display, str webp, str png,
+                                n_features x map_nbytes(size) bytes of packed maps)
+
+where str is u16 length + UTF-8. registry.AnimalRegistry(pack=...) loads it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import assets
+import bitmaps
+import convcore
+import convengine
+from convcore import FEATURES, FM_SIZE, IMG_SIZE
+
+MAGIC = b"GAPK"
+PACK_VERSION = 1
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# Anything that changes the output for unchanged sources
+BUILD_VERSION = f"{PACK_VERSION}-{convengine.ENGINE_VERSION}-{assets.VARIANT_SIZE}-{FM_SIZE}"
+
+
+# -------------------------------------------------
+# Reading and writing packs
+# -------------------------------------------------
+
+def _put_str(out, text):
+    data = text.encode("utf-8")
+    out.append(struct.pack("<H", len(data)))
+    out.append(data)
+
+
+def _replace(path, data):
+    # Write next to path and rename over it, so a reader (the app reloads the
+    # pack when it changes) never sees half a file and two builds never share
+    # a temp file
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_pack(path, records, features=FEATURES, size=FM_SIZE):
+    """records: [{"key", "name", "display", "webp", "png", "maps": {feature: int}}, ...]"""
+    out = [MAGIC, struct.pack("<HBB", PACK_VERSION, size, len(features))]
+    for f in features:
+        _put_str(out, f)
+    out.append(struct.pack("<I", len(records)))
+    for rec in records:
+        for field in ("key", "name", "display", "webp", "png"):
+            _put_str(out, rec[field])
+        for f in features:
+            out.append(bitmaps.map_to_bytes(rec["maps"].get(f, 0), size))
+
+    _replace(path, b"".join(out))
+
+
+def read_pack(path):
+    """-> (features, size, records) as written by write_pack()."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a content pack")
+    version, size, n_features = struct.unpack_from("<HBB", data, 4)
+    if version != PACK_VERSION:
+        raise ValueError(f"{path} is pack version {version}, expected {PACK_VERSION}")
+    pos = 8
+
+    def get_str():
+        nonlocal pos
+        (n,) = struct.unpack_from("<H", data, pos)
+        text = data[pos + 2:pos + 2 + n].decode("utf-8")
+        pos += 2 + n
+        return text
+
+    try:
+        features = [get_str() for _ in range(n_features)]
+        (count,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        nbytes = bitmaps.map_nbytes(size)
+        records = []
+        for _ in range(count):
+            rec = {field: get_str() for field in ("key", "name", "display", "webp", "png")}
+            maps = {}
+            for f in features:
+                maps[f] = bitmaps.map_from_bytes(data[pos:pos + nbytes])
+                pos += nbytes
+            rec["maps"] = maps
+            records.append(rec)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"{path} is truncated or corrupt") from e
+    return features, size, records
+
+
+# -------------------------------------------------
+# Building one animal (runs in a worker process)
+# -------------------------------------------------
+
+def source_hash(folder):
+    """Hash of every file under folder (names and contents) plus BUILD_VERSION."""
+    h = hashlib.sha256(BUILD_VERSION.encode())
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            h.update(os.path.relpath(path, folder).encode() + b"\0")
+            h.update(assets.file_hash(path).encode())
+    return h.hexdigest()
+
+
+def find_image(folder):
+    for name in sorted(os.listdir(folder)):
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+            return os.path.join(folder, name)
+    raise FileNotFoundError(f"no image in {folder}")
+
+
+def maps_from_masks(mask_dir):
+    """{feature: packed int} from masks/<feature>.png part masks."""
+    ones = np.ones((1, convcore.FILTER_SIZE, convcore.FILTER_SIZE), dtype=np.float32)
+    maps = {}
+    for f in FEATURES:
+        path = os.path.join(mask_dir, f + ".png")
+        if not os.path.exists(path):
+            maps[f] = 0
+            continue
+        with Image.open(path) as img:
+            part = np.asarray(img.convert("L").resize((IMG_SIZE, IMG_SIZE), Image.BOX)) >= 128
+        covered = convcore.conv2d(part, ones, convcore.STRIDE, convcore.PADDING)[0] > 0
+        maps[f] = bitmaps.array_to_map(covered)
+    return maps
+
+
+def build_animal(job):
+    """(key, folder, digest, static_dir) -> manifest entry for that animal."""
+    key, folder, digest, static_dir = job
+    with open(os.path.join(folder, "meta.json")) as fh:
+        meta = json.load(fh)
+    image = find_image(folder)
+
+    stem = f"{assets.BUILD_DIR}/{key}.{digest[:12]}.{assets.VARIANT_SIZE}"
+    outputs = {fmt: f"{stem}.{fmt}" for fmt in assets.FORMATS}
+    assets.write_variants(image, outputs, static_dir)
+
+    maps_path = os.path.join(folder, "maps.json")
+    mask_dir = os.path.join(folder, "masks")
+    if os.path.exists(maps_path):
+        with open(maps_path) as fh:
+            maps = bitmaps.pack_maps(json.load(fh))
+    elif os.path.isdir(mask_dir):
+        maps = maps_from_masks(mask_dir)
+    else:
+        maps = bitmaps.pack_maps(convengine.compute_feature_maps(convengine.load_ink_grid(image)))
+
+    return {
+        "hash": digest,
+        "key": key,
+        "name": meta["name"],
+        "display": meta.get("display", key),
+        "webp": outputs["webp"],
+        "png": outputs["png"],
+        "maps": {f: bitmaps.map_to_b64(maps.get(f, 0), FM_SIZE) for f in FEATURES},
+    }
+
+
+# -------------------------------------------------
+# Building a pack
+# -------------------------------------------------
+
+def manifest_path(pack_path):
+    return pack_path + ".manifest.json"
+
+
+def load_manifest(pack_path):
+    try:
+        with open(manifest_path(pack_path)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == BUILD_VERSION else {}
+
+
+def build_pack(source, pack_path, static_dir=assets.STATIC_DIR, workers=None, force=False, log=None):
+    """Build pack_path from source; returns (rebuilt keys, reused keys)."""
+    from registry import natural_key   # registry imports this module
+
+    old = {} if force else load_manifest(pack_path).get("animals", {})
+    keys = sorted((name for name in os.listdir(source)
+                   if not name.startswith(".") and os.path.isdir(os.path.join(source, name))),
+                  key=natural_key)
+
+    os.makedirs(os.path.join(static_dir, assets.BUILD_DIR), exist_ok=True)
+
+    entries, jobs = {}, []
+    for key in keys:
+        folder = os.path.join(source, key)
+        digest = source_hash(folder)
+        entry = old.get(key)
+        if (entry is not None and entry["hash"] == digest
+                and all(os.path.exists(os.path.join(static_dir, entry[fmt])) for fmt in ("webp", "png"))):
+            entries[key] = entry
+        else:
+            jobs.append((key, folder, digest, static_dir))
+
+    if len(jobs) > 1 and workers != 1:
+        with ProcessPoolExecutor(workers) as pool:
+            built = list(pool.map(build_animal, jobs, chunksize=max(1, len(jobs) // 64)))
+    else:
+        built = [build_animal(job) for job in jobs]
+    for entry in built:
+        entries[entry["key"]] = entry
+        if log:
+            log(f"built {entry['key']}")
+
+    records = []
+    for key in keys:
+        entry = entries[key]
+        records.append({**entry, "maps": {f: bitmaps.map_from_b64(b) for f, b in entry["maps"].items()}})
+    write_pack(pack_path, records)
+
+    _replace(manifest_path(pack_path), json.dumps({"version": BUILD_VERSION, "animals": entries}).encode())
+    rebuilt = [job[0] for job in jobs]
+    return rebuilt, [key for key in keys if key not in set(rebuilt)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a binary animal content pack")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build (or update) a pack from a source folder")
+    build.add_argument("source")
+    build.add_argument("pack")
+    build.add_argument("--static", default=assets.STATIC_DIR, help="where static/build lives")
+    build.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    build.add_argument("--force", action="store_true", help="rebuild every animal")
+    build.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rebuilt, reused = build_pack(args.source, args.pack, args.static, args.workers, args.force,
+                                 log=print if args.verbose else None)
+    print(f"{args.pack}: {len(rebuilt)} built, {len(reused)} unchanged, "
+          f"{os.path.getsize(args.pack) // 1024} KB, {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
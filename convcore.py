@@ -0,0 +1,128 @@
+"""The convolution settings and maths shared by every frontend.
+
+app.py (and through it static/js/app.js), convgame.py, convolutiongame.py and
+convengine.py all take IMG_SIZE, FILTER_SIZE, STRIDE, FM_SIZE and FEATURES
+from here, so the game only has to be reconfigured in one place.
+
+conv2d/pool2d work on stacks of channels, (..., C, H, W), using
+sliding_window_view and a single einsum/reduction, so any filter size,
+stride and padding is fine. run_pipeline() pushes the six feature maps
+through further layers (pooling, a second conv layer) to show a whole small
+CNN; pipeline_for() caches the result per animal so nothing is recomputed
+while students click around.
+"""
+import hashlib
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+IMG_SIZE = 30
+FILTER_SIZE = 3
+STRIDE = 3
+PADDING = 0
+FM_SIZE = (IMG_SIZE + 2 * PADDING - FILTER_SIZE) // STRIDE + 1
+
+FEATURES = ["eye", "ear", "leg", "neck", "arm", "wing"]
+
+
+def output_size(size, filter_size, stride=1, padding=0):
+    return (size + 2 * padding - filter_size) // stride + 1
+
+
+def _pad(x, padding):
+    if not padding:
+        return x
+    widths = [(0, 0)] * (x.ndim - 2) + [(padding, padding), (padding, padding)]
+    return np.pad(x, widths)
+
+
+def conv2d(x, weights, stride=1, padding=0):
+    """(..., C, H, W) * (F, C, k, k) -> (..., F, H', W').
+
+    A single-channel (..., H, W) input with (F, k, k) weights is fine too.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    weights = np.asarray(weights, dtype=np.float32)
+    if weights.ndim == 3:
+        x = x[..., None, :, :]
+        weights = weights[:, None]
+    k = weights.shape[-1]
+    windows = sliding_window_view(_pad(x, padding), (k, k), axis=(-2, -1))
+    windows = windows[..., ::stride, ::stride, :, :]
+    return np.einsum("...chwij,fcij->...fhw", windows, weights, optimize=True)
+
+
+def pool2d(x, size=2, stride=None, mode="max"):
+    """Max or average pooling over the last two axes."""
+    stride = stride or size
+    windows = sliding_window_view(np.asarray(x, dtype=np.float32), (size, size), axis=(-2, -1))
+    windows = windows[..., ::stride, ::stride, :, :]
+    if mode == "max":
+        return windows.max(axis=(-2, -1))
+    if mode == "avg":
+        return windows.mean(axis=(-2, -1))
+    raise ValueError(f"unknown pooling mode {mode!r}")
+
+
+# After the six feature maps: "is there an eye somewhere in this 2x2 block",
+# then a second conv layer that combines features into body parts.
+SECOND_LAYER_FEATURES = ["head", "body"]
+SECOND_LAYER_WEIGHTS = {
+    #        eye ear leg neck arm wing
+    "head": [1,  1,  0,  1,   0,  0],
+    "body": [0,  0,  1,  1,   1,  1],
+}
+
+DEFAULT_PIPELINE = [
+    {"name": "pool1", "type": "pool", "size": 2, "mode": "max"},
+    {"name": "conv2", "type": "conv", "features": SECOND_LAYER_FEATURES,
+     "filter_size": 3, "stride": 1, "padding": 1, "relu": True},
+    {"name": "pool2", "type": "pool", "size": 2, "mode": "avg"},
+]
+
+
+def layer_weights(layer, channels):
+    """(F, C, k, k) weights for a conv layer spec: per-channel weight, spread over the window."""
+    k = layer["filter_size"]
+    mix = np.array([SECOND_LAYER_WEIGHTS[f] for f in layer["features"]], dtype=np.float32)
+    return np.broadcast_to(mix[:, :channels, None, None], (len(mix), channels, k, k)) / (k * k)
+
+
+def run_pipeline(maps, layers=DEFAULT_PIPELINE):
+    """maps: (C, H, W) array (e.g. the six feature maps as 0/1).
+
+    Returns [(layer name, output array), ...] starting with ("features", maps).
+    """
+    x = np.asarray(maps, dtype=np.float32)
+    outputs = [("features", x)]
+    for layer in layers:
+        if layer["type"] == "pool":
+            x = pool2d(x, layer["size"], layer.get("stride"), layer.get("mode", "max"))
+        elif layer["type"] == "conv":
+            x = conv2d(x, layer_weights(layer, x.shape[-3]),
+                       layer.get("stride", 1), layer.get("padding", 0))
+            if layer.get("relu"):
+                x = np.maximum(x, 0)
+        else:
+            raise ValueError(f"unknown layer type {layer['type']!r}")
+        outputs.append((layer["name"], x))
+    return outputs
+
+
+def pipeline_key(layers):
+    return hashlib.sha256(json.dumps(layers, sort_keys=True).encode()).hexdigest()[:12]
+
+
+_pipeline_cache = {}
+
+
+def pipeline_for(key, maps, layers=DEFAULT_PIPELINE):
+    """run_pipeline() memoised on (key, layers). Make key change when the maps do."""
+    cache_key = (key, pipeline_key(layers))
+    result = _pipeline_cache.get(cache_key)
+    if result is None:
+        if len(_pipeline_cache) >= 4096:
+            _pipeline_cache.clear()
+        result = _pipeline_cache[cache_key] = run_pipeline(maps, layers)
+    return result
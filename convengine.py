@@ -0,0 +1,183 @@
+"""Derive the 10x10 feature maps straight from the animal images.
+
+The image is squashed down to an IMG_SIZE x IMG_SIZE "ink" grid (1 = dark,
+0 = background) and all six filters are applied at once with
+convcore.conv2d (FILTER_SIZE, STRIDE and PADDING come from convcore). Results are
+cached on disk under .cache/feature_maps, keyed by the image's content hash,
+so each image is only ever convolved once. The cache is best effort: if it
+can't be written the maps are still returned, just computed again next time.
+
+    python convengine.py static/images/giraffe.png
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from convcore import FEATURES, FILTER_SIZE, FM_SIZE, IMG_SIZE, PADDING, STRIDE, conv2d
+
+log = logging.getLogger(__name__)
+
+# Simple shape detectors standing in for the "eye", "ear", ... filters the
+# students imagine. They work on the ink grid, so positive weights look for
+# dark pixels and negative weights for background.
+FEATURE_FILTERS = {
+    "eye": [[-1, -1, -1],
+            [-1,  8, -1],
+            [-1, -1, -1]],
+    "ear": [[-1,  2, -1],
+            [ 1, -1,  1],
+            [ 1, -1,  1]],
+    "leg": [[ 1, -1,  1],
+            [ 1, -1,  1],
+            [ 1, -1,  1]],
+    "neck": [[-1,  2, -1],
+             [-1,  2, -1],
+             [-1,  2, -1]],
+    "arm": [[-1, -1, -1],
+            [ 2,  2,  2],
+            [-1, -1, -1]],
+    "wing": [[1, 1, 1],
+             [1, 1, 1],
+             [1, 1, 1]],
+}
+
+# A cell lights up when its response reaches this fraction of the best
+# possible response for that filter.
+THRESHOLD = 0.5
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "feature_maps")
+
+# Part of the cache key, so changing the filters invalidates old entries
+ENGINE_VERSION = hashlib.sha256(json.dumps(
+    [IMG_SIZE, FILTER_SIZE, STRIDE, PADDING, FEATURES, FEATURE_FILTERS, THRESHOLD]
+).encode()).hexdigest()[:12]
+
+
+def filter_bank():
+    """(len(FEATURES), FILTER_SIZE, FILTER_SIZE) float32 array of the filters."""
+    return np.array([FEATURE_FILTERS[f] for f in FEATURES], dtype=np.float32)
+
+
+def load_ink_grid(source, size=IMG_SIZE):
+    """Open an image (path or file object) and return a size x size ink grid."""
+    img = Image.open(source)
+    if img.mode in ("RGBA", "LA", "P"):
+        # Transparent background counts as paper, not ink
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    gray = img.convert("L").resize((size, size), Image.BOX)
+    ink = 1.0 - np.asarray(gray, dtype=np.float32) / 255.0
+
+    # Stretch so the typical (background) level is 0 and the darkest cell is 1
+    background = np.median(ink)
+    span = ink.max() - background
+    if span <= 0:
+        return np.zeros_like(ink)
+    return np.clip((ink - background) / span, 0.0, 1.0)
+
+
+def threshold_maps(responses, filters, threshold=THRESHOLD):
+    # Best possible response = every positive weight sees full ink
+    best = np.clip(filters, 0, None).sum(axis=(1, 2))
+    return responses >= (threshold * best)[:, None, None]
+
+
+def batch_feature_maps(grids):
+    """(N, IMG_SIZE, IMG_SIZE) ink grids -> (N, len(FEATURES), FM_SIZE, FM_SIZE) bool, in one conv2d call."""
+    filters = filter_bank()
+    return threshold_maps(conv2d(grids, filters, STRIDE, PADDING), filters)
+
+
+def feature_maps_for_blobs(blobs):
+    """Decode a batch of image files (bytes) and compute all their maps at once.
+
+    Returns (hits, ok): hits as from batch_feature_maps() for the images that
+    decoded, and ok[i] telling whether blobs[i] was one of them. Runs fine in
+    a worker process.
+    """
+    grids, ok = [], []
+    for data in blobs:
+        try:
+            grids.append(load_ink_grid(io.BytesIO(data)))
+            ok.append(True)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            ok.append(False)
+    if not grids:
+        return np.zeros((0, len(FEATURES), FM_SIZE, FM_SIZE), dtype=bool), ok
+    return batch_feature_maps(np.stack(grids)), ok
+
+
+def iter_feature_rows(grid):
+    """Yield (row, responses, hits) for one feature-map row at a time.
+
+    Only the FILTER_SIZE rows of the grid under the filter are convolved per
+    step, so the first row is ready right away and memory stays flat.
+    responses and hits are (len(FEATURES), FM_SIZE) arrays.
+    """
+    filters = filter_bank()
+    if PADDING:
+        grid = np.pad(grid, PADDING)
+    out_rows = (grid.shape[0] - FILTER_SIZE) // STRIDE + 1
+    for r in range(out_rows):
+        top = r * STRIDE
+        responses = conv2d(grid[top:top + FILTER_SIZE], filters, STRIDE)[:, 0]
+        yield r, responses, threshold_maps(responses[:, None], filters)[:, 0]
+
+
+def compute_feature_maps(grid):
+    """Ink grid -> {feature: FM_SIZE x FM_SIZE list of 0/1}, same shape as GIRAFFE_MAPS."""
+    filters = filter_bank()
+    hits = threshold_maps(conv2d(grid, filters, STRIDE, PADDING), filters)
+    return {f: hits[i].astype(int).tolist() for i, f in enumerate(FEATURES)}
+
+
+def image_key(data):
+    return hashlib.sha256(data).hexdigest() + "-" + ENGINE_VERSION
+
+
+def feature_maps_for_image(path, cache_dir=CACHE_DIR):
+    """Feature maps for an image file, computed once per distinct image content."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    key = image_key(data)
+    cache_path = os.path.join(cache_dir, key + ".json")
+
+    try:
+        with open(cache_path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        pass
+
+    maps = compute_feature_maps(load_ink_grid(io.BytesIO(data)))
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # A temp file of our own, so concurrent workers never share one
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(maps, fh)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        log.warning("could not cache feature maps in %s: %s", cache_dir, e)
+    return maps
+
+
+if __name__ == "__main__":
+    for image_path in sys.argv[1:]:
+        print(image_path)
+        for feature, fm in feature_maps_for_image(image_path).items():
+            print(f"  {feature}:")
+            for row in fm:
+                print("    " + "".join("#" if v else "." for v in row))
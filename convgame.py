@@ -1,103 +1,28 @@
+import os
 import tkinter as tk
 import random
 
-IMG_SIZE = 30
-FILTER_SIZE = 3
-STRIDE = 3
-FM_SIZE = IMG_SIZE // STRIDE  # 10x10
+from assets import STATIC_DIR
+from bitmaps import pack_maps, bit_at
+from convcore import IMG_SIZE, FILTER_SIZE, STRIDE, PADDING, FM_SIZE, FEATURES
+from convengine import feature_maps_for_image
+from registry import registry_from_env
+
 CELL_SIZE = 20
 
-FEATURES = ["eye", "ear", "leg", "neck", "arm", "wing"]
-
-# -------------------------------
-# Hardcoded feature maps (all 10x10)
-# -------------------------------
-HARDCODED_MAPS = {
-    "eye": [
-        [0,0,0,0,1,0,1,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-
-    "ear": [
-        [0,0,0,1,0,0,1,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-
-    "leg": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,1,1,0,1,1,0,0,0],
-        [0,0,1,1,0,1,1,0,0,0],
-    ],
-
-    "neck": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-
-    "arm": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-
-    "wing": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-}
-
-
-def make_feature_maps():
-    fm = {}
-    for f in FEATURES:
-        fm[f] = [[bool(val) for val in row] for row in HARDCODED_MAPS[f]]
-    return fm
+# The giraffe from animals/ (see registry.py); this version of the game only
+# ever shows the one animal
+ANIMAL_KEY = "animal1"
+ANIMAL_IMAGE = os.path.join(STATIC_DIR, "images", "giraffe.png")
+
+
+def make_feature_maps(key=ANIMAL_KEY):
+    # One packed int per feature instead of 100 bools (see bitmaps.py)
+    animal = registry_from_env(STATIC_DIR).get(key)
+    if animal is not None:
+        return animal.maps
+    # Not in the catalog (e.g. a content pack without it): derive them from the image
+    return pack_maps(feature_maps_for_image(ANIMAL_IMAGE))
 
 
 class ConvolutionGame:
@@ -112,6 +37,7 @@ class ConvolutionGame:
         self.feature_maps = make_feature_maps()
         self.filter_buttons = {}
         self.fm_canvases = {}   # NEW: store each feature map's canvas
+        self.fm_cells = {}      # cell rectangles per map, recoloured in place
 
         self.user_maps = {
             f: [[None for _ in range(FM_SIZE)] for _ in range(FM_SIZE)]
@@ -138,6 +64,7 @@ class ConvolutionGame:
                                     bg="black")
         self.img_canvas.grid(row=1, column=1, padx=10, pady=10)
         self.draw_grid(self.img_canvas, IMG_SIZE)
+        self.patch_item = None
         self.img_canvas.bind("<Button-1>", self.handle_image_click)
 
         # ---------------- Right: all feature maps ----------------
@@ -164,7 +91,7 @@ class ConvolutionGame:
                                    bg="white")
                 canvas.pack()
 
-                self.draw_grid(canvas, FM_SIZE)
+                self.fm_cells[f] = self.draw_grid(canvas, FM_SIZE)
                 self.fm_canvases[f] = canvas
 
                 idx += 1
@@ -174,11 +101,12 @@ class ConvolutionGame:
 
     # ----------------------
     def draw_grid(self, canvas, size):
-        for i in range(size):
-            for j in range(size):
-                canvas.create_rectangle(j*CELL_SIZE, i*CELL_SIZE,
-                                        (j+1)*CELL_SIZE, (i+1)*CELL_SIZE,
-                                        outline="gray")
+        # Returns the cell item ids as [row][col]
+        return [[canvas.create_rectangle(j*CELL_SIZE, i*CELL_SIZE,
+                                         (j+1)*CELL_SIZE, (i+1)*CELL_SIZE,
+                                         outline="gray")
+                 for j in range(size)]
+                for i in range(size)]
 
     # ----------------------
     def select_feature(self, feature):
@@ -194,53 +122,51 @@ class ConvolutionGame:
 
     # ----------------------
     def redraw_feature_map(self, feature):
-        canvas = self.fm_canvases[feature]
-        canvas.delete("cell")
-
         for r in range(FM_SIZE):
             for c in range(FM_SIZE):
-                color = self.user_maps[feature][r][c]
-                if color:
-                    canvas.create_rectangle(
-                        c*CELL_SIZE, r*CELL_SIZE,
-                        (c+1)*CELL_SIZE, (r+1)*CELL_SIZE,
-                        fill=color, outline="gray",
-                        tags="cell"
-                    )
+                self.update_cell(feature, r, c)
+
+    def update_cell(self, feature, r, c):
+        color = self.user_maps[feature][r][c]
+        self.fm_canvases[feature].itemconfig(self.fm_cells[feature][r][c],
+                                             fill=color or "")
 
     # ----------------------
     def handle_image_click(self, event):
         col = event.x // CELL_SIZE
         row = event.y // CELL_SIZE
 
-        fm_row = row // STRIDE
-        fm_col = col // STRIDE
+        fm_row = (row + PADDING) // STRIDE
+        fm_col = (col + PADDING) // STRIDE
 
         if not (0 <= fm_row < FM_SIZE and 0 <= fm_col < FM_SIZE):
             return
 
-        truth = self.feature_maps[self.selected_feature][fm_row][fm_col]
+        truth = bit_at(self.feature_maps[self.selected_feature], FM_SIZE, fm_row, fm_col)
         color = "red" if truth else "blue"
 
         self.user_maps[self.selected_feature][fm_row][fm_col] = color
 
-        self.redraw_feature_map(self.selected_feature)
+        self.update_cell(self.selected_feature, fm_row, fm_col)
         self.highlight_patch(fm_row, fm_col)
 
     # ----------------------
     def highlight_patch(self, fm_row, fm_col):
-        self.img_canvas.delete("patch")
-        top = fm_row * STRIDE
-        left = fm_col * STRIDE
-
-        self.img_canvas.create_rectangle(
-            left * CELL_SIZE, top * CELL_SIZE,
-            (left + FILTER_SIZE) * CELL_SIZE,
-            (top + FILTER_SIZE) * CELL_SIZE,
-            outline="yellow", width=3, tags="patch"
-        )
-
-
-root = tk.Tk()
-game = ConvolutionGame(root)
-root.mainloop()
+        top = fm_row * STRIDE - PADDING
+        left = fm_col * STRIDE - PADDING
+        coords = (left * CELL_SIZE, top * CELL_SIZE,
+                  (left + FILTER_SIZE) * CELL_SIZE,
+                  (top + FILTER_SIZE) * CELL_SIZE)
+
+        if self.patch_item is None:
+            self.patch_item = self.img_canvas.create_rectangle(
+                *coords, outline="yellow", width=3
+            )
+        else:
+            self.img_canvas.coords(self.patch_item, *coords)
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    game = ConvolutionGame(root)
+    root.mainloop()
@@ -1,127 +1,145 @@
+import argparse
+import os
+import time
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from PIL import Image, ImageTk
 
-IMG_SIZE = 30
-FILTER_SIZE = 3
-STRIDE = 3
-FM_SIZE = IMG_SIZE // STRIDE
+from convcore import IMG_SIZE, FILTER_SIZE, STRIDE, PADDING, FM_SIZE, FEATURES
+from catalogindex import LiveIndex
+from engine import COLORS, GameEngine
+from gridview import CanvasGrid, RasterGrid, fit
+from hints import CatalogHints
+from registry import registry_from_env
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
 CELL_SIZE = 20
 
-FEATURES = ["eye", "ear", "leg", "neck", "arm", "wing"]
-
-HARDCODED_MAPS = {
-    "eye": [
-        [0,0,0,0,1,1,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "ear": [
-        [0,0,0,0,1,0,1,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "leg": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,1,0,1,1,0,0,0],
-        [0,0,0,1,0,1,1,0,0,0],
-    ],
-    "neck": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,1,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "arm": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ],
-    "wing": [
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],
-    ]
-}
-
-def make_feature_maps():
-    return {f: [[bool(v) for v in row] for row in HARDCODED_MAPS[f]] for f in FEATURES}
+# Largest the image and feature map views get; bigger grids get smaller cells
+IMG_VIEW_PX = 600
+FM_VIEW_PX = 200
+
+# "auto" draws grids into images (gridview.RasterGrid) above this many cells
+RASTER_ABOVE = 5000
+
+# Saves wait for a pause in the student's input, but no longer than this
+SAVE_IDLE_MS = 1000
+SAVE_MAX_DELAY = 5.0
+
+
+class ImageCache:
+    """Decodes and resizes images on a worker thread and keeps the most
+    recently used `capacity` of them as PhotoImages.
+
+    PhotoImages may only be created on the Tk thread, so finished decodes are
+    collected by polling with root.after().
+    """
+
+    POLL_MS = 30
+
+    def __init__(self, root, size, capacity=4):
+        self.root = root
+        self.size = size
+        self.capacity = capacity
+        self._photos = OrderedDict()
+        self._pending = {}      # path -> (future, [callbacks])
+        self._polling = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-decode")
+
+    def _decode(self, path):
+        with Image.open(path) as img:
+            return img.convert("RGBA").resize((self.size, self.size), Image.LANCZOS)
+
+    def get(self, path):
+        """The PhotoImage for path if it is ready, else None."""
+        photo = self._photos.get(path)
+        if photo is not None:
+            self._photos.move_to_end(path)
+        return photo
+
+    def request(self, path, callback=None):
+        """Start decoding path (if needed); callback(photo or None) when done."""
+        photo = self.get(path)
+        if photo is not None:
+            if callback:
+                callback(photo)
+            return
+        if path not in self._pending:
+            self._pending[path] = (self._executor.submit(self._decode, path), [])
+            self._schedule_poll()
+        if callback:
+            self._pending[path][1].append(callback)
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self._polling = False
+        for path, (future, callbacks) in list(self._pending.items()):
+            if not future.done():
+                continue
+            del self._pending[path]
+            try:
+                photo = ImageTk.PhotoImage(future.result())
+            except (OSError, ValueError):
+                photo = None
+            else:
+                self._photos[path] = photo
+                while len(self._photos) > self.capacity:
+                    self._photos.popitem(last=False)
+            for callback in callbacks:
+                callback(photo)
+        if self._pending:
+            self._schedule_poll()
 
 
 class ConvolutionGame:
-    def __init__(self, root):
+    def __init__(self, root, registry=None, recorder=None, saves=None, profile="default",
+                 renderer="auto"):
         self.root = root
         self.root.title("Convolution Activity")
+        self.recorder = recorder  # a recording.Recorder logging every input, or None
+
+        # A saves.SaveStore to resume from and save to, or None
+        self.saves = saves
+        self.profile = profile
+        self.saved_games = {}   # animal key -> saved state, restored when first shown
+        self._dirty = set()
+        self._dirty_since = 0.0
+        self._save_job = None
+        first_key = None
+        if saves is not None:
+            first_key, self.saved_games = saves.load(profile)
+
+        self.registry = registry or registry_from_env(STATIC_DIR)
+        self.animal_keys = list(self.registry.keys())
+        self.hints = CatalogHints(LiveIndex(self.registry))
+        self.animal = None
+        # The game itself (see engine.py); this class only draws it
+        self.engine = None
+        self.games = {}  # animal key -> GameEngine
 
         # Title
         tk.Label(root, text="Guess the Animal!",
                  font=("Arial", 26, "bold")).grid(row=0, column=0, columnspan=3, pady=10)
 
-        # Load giraffe image (when guessed correctly)
-        try:
-            self.giraffe_img = Image.open("giraffe2.png")
-            self.giraffe_img = self.giraffe_img.resize(
-                (IMG_SIZE * CELL_SIZE, IMG_SIZE * CELL_SIZE))
-            self.giraffe_img_tk = ImageTk.PhotoImage(self.giraffe_img)
-        except:
-            self.giraffe_img_tk = None
-
-        self.image_revealed = False
-
-        self.feature_maps = make_feature_maps()
+        # "canvas" (a canvas item per cell) or "raster" (zoomable images), see gridview.py
+        if renderer == "auto":
+            cells = IMG_SIZE * IMG_SIZE + len(FEATURES) * FM_SIZE * FM_SIZE
+            renderer = "raster" if cells > RASTER_ABOVE else "canvas"
+        self.renderer = renderer
+        img_cell, img_px = fit(IMG_SIZE, IMG_VIEW_PX, CELL_SIZE)
+        fm_cell, fm_px = fit(FM_SIZE, FM_VIEW_PX, CELL_SIZE)
 
-        self.user_maps = {
-            f: [[None for _ in range(FM_SIZE)] for _ in range(FM_SIZE)]
-            for f in FEATURES
-        }
-
-        # Start with no selected position
-        self.cursor_row = None
-        self.cursor_col = None
-
-        self.selected_feature = FEATURES[0]
-        self.saved_positions = {f: (None, None) for f in FEATURES}
+        # Animal images (shown when guessed correctly) are decoded in the background
+        self.images = ImageCache(root, img_px)
 
+        self.image_revealed = False
 
         # Key bindings
         root.bind("<Left>", self.move_left)
@@ -132,28 +150,41 @@ class ConvolutionGame:
         # LEFT panel
         control = tk.Frame(root)
         control.grid(row=1, column=0, padx=10)
-        tk.Label(control, text="Select Filter:", font=("Arial", 14)).pack()
+
+        tk.Label(control, text="Animal:", font=("Arial", 14)).pack()
+        self.animal_buttons = {}
+        for key in self.animal_keys:
+            animal = self.registry.get(key)
+            btn = tk.Button(control, text=animal.display if animal else key, width=12,
+                            command=lambda k=key: self.select_animal(k))
+            btn.pack(pady=4)
+            self.animal_buttons[key] = btn
+
+        tk.Label(control, text="Select Filter:", font=("Arial", 14)).pack(pady=(12, 0))
 
         self.filter_buttons = {}
         for f in FEATURES:
             btn = tk.Button(control, text=f.capitalize(), width=12,
-                            command=lambda ff=f: self.select_feature(ff))
+                            command=lambda ff=f: self.pick_feature(ff))
             btn.pack(pady=4)
             self.filter_buttons[f] = btn
 
+        tk.Button(control, text="Hint", width=12,
+                  command=self.show_hint).pack(pady=(12, 4))
+
         # CENTER image canvas
         self.img_canvas = tk.Canvas(root,
-                                    width=IMG_SIZE * CELL_SIZE,
-                                    height=IMG_SIZE * CELL_SIZE,
+                                    width=img_px,
+                                    height=img_px,
                                     bg="black")
         self.img_canvas.grid(row=1, column=1, padx=10, pady=10)
-        self.draw_grid(self.img_canvas, IMG_SIZE)
+        self.img_grid = self.make_grid(self.img_canvas, IMG_SIZE, img_cell, (None,), "black")
         self.img_canvas.bind("<Button-1>", self.handle_image_click)
 
         # RIGHT feature maps
         fm_frame = tk.Frame(root)
         fm_frame.grid(row=1, column=2, padx=10)
-        self.fm_canvases = {}
+        self.fm_grids = {}
 
         idx = 0
         for r in range(2):
@@ -169,13 +200,12 @@ class ConvolutionGame:
                          font=("Arial", 13)).pack()
 
                 canvas = tk.Canvas(sub,
-                                   width=FM_SIZE * CELL_SIZE,
-                                   height=FM_SIZE * CELL_SIZE,
+                                   width=fm_px,
+                                   height=fm_px,
                                    bg="white")
                 canvas.pack()
 
-                self.draw_grid(canvas, FM_SIZE)
-                self.fm_canvases[f] = canvas
+                self.fm_grids[f] = self.make_grid(canvas, FM_SIZE, fm_cell, COLORS, "white")
 
                 idx += 1
 
@@ -192,49 +222,116 @@ class ConvolutionGame:
         self.feedback_label = tk.Label(root, text="", font=("Arial", 18))
         self.feedback_label.grid(row=3, column=1)
 
-        self.select_feature(self.selected_feature)
-        self.redraw_all_feature_maps()
+        self.select_animal(first_key if first_key in self.animal_keys else self.animal_keys[0])
 
     # -------------------------------------------------
 
-    def draw_grid(self, canvas, size):
-        for i in range(size):
-            for j in range(size):
-                canvas.create_rectangle(
-                    j * CELL_SIZE, i * CELL_SIZE,
-                    (j+1)*CELL_SIZE, (i+1)*CELL_SIZE,
-                    outline="gray"
-                )
+    def make_grid(self, canvas, size, cell_size, palette, background):
+        if self.renderer == "raster":
+            grid = RasterGrid(canvas, size, size, cell_size, palette, background=background)
+            grid.bind_navigation()
+            return grid
+        return CanvasGrid(canvas, size, size, cell_size, palette)
 
     # -------------------------------------------------
 
-    def select_feature(self, feature):
-        self.selected_feature = feature
-        saved_r, saved_c = self.saved_positions[feature]
+    def image_path(self, animal):
+        return os.path.join(STATIC_DIR, animal.image)
+
+    def record(self, event, *args):
+        """Called for every input, before it is applied."""
+        if self.recorder is not None:
+            getattr(self.recorder, event)(*args)
+        if self.saves is not None:
+            self.schedule_save()
 
-        if saved_r is not None:
-            self.cursor_row, self.cursor_col = saved_r, saved_c
-            self.highlight_patch()
-            self.highlight_feature_cell(saved_r, saved_c)
+    # -------------------------------------------------
+    # Saving
+    # -------------------------------------------------
+
+    def schedule_save(self):
+        if self.animal is not None:
+            self._dirty.add(self.animal.key)
+        now = time.monotonic()
+        if self._save_job is None:
+            self._dirty_since = now
+        elif now - self._dirty_since < SAVE_MAX_DELAY:
+            self.root.after_cancel(self._save_job)
         else:
-            # If no saved position, clear highlights
-            self.cursor_row = None
-            self.cursor_col = None
-            self.img_canvas.delete("patch")
+            return
+        self._save_job = self.root.after(SAVE_IDLE_MS, self.save_now)
+
+    def save_now(self):
+        """Write the changed animals (and which one is showing) in one transaction."""
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+            self._save_job = None
+        if self.saves is None or self.animal is None:
+            return
+        games = {key: self.games[key] for key in self._dirty if key in self.games}
+        self._dirty.clear()
+        self.saves.save(self.profile, self.animal.key, games)
+
+    def select_animal(self, key):
+        self.record("animal", key)
+        self.animal = self.registry.get(key)
+        self.engine = self.games.get(key)
+        if self.engine is None:
+            self.engine = self.games[key] = GameEngine(self.animal)
+            saved = self.saved_games.pop(key, None)
+            if saved is not None:
+                try:
+                    self.engine.restore_state(*saved)
+                except ValueError:
+                    pass  # saved with a different board size: start over
+
+        # Put the hidden grid back if the previous animal's image was showing
+        if self.image_revealed:
+            self.img_canvas.delete("photo", "loading")
+        self.image_revealed = False
+
+        for k, btn in self.animal_buttons.items():
+            btn.config(bg="lightblue" if k == key else "SystemButtonFace")
+        self.guess_entry.delete(0, "end")
+        self.feedback_label.config(text="")
 
-        # Clear highlight from all feature maps
-        for canvas in self.fm_canvases.values():
-            canvas.delete("fm_patch")
+        self.redraw_all_feature_maps()
+        self.select_feature(FEATURES[0])
+
+        if self.engine.correct:
+            self.feedback_label.config(text="Correct!", fg="green")
+            self.reveal_image()
+
+        # Decode this animal's image and the next one's while the student plays
+        self.images.request(self.image_path(self.animal))
+        next_key = self.animal_keys[(self.animal_keys.index(key) + 1) % len(self.animal_keys)]
+        next_animal = self.registry.get(next_key)
+        if next_animal is not None:
+            self.images.request(self.image_path(next_animal))
+
+    # -------------------------------------------------
+
+    def pick_feature(self, feature):
+        # A filter button (select_feature is also called by the game itself)
+        self.record("feature", feature)
+        self.select_feature(feature)
+
+    def select_feature(self, feature):
+        # The cursor goes back to where it last was on this map, if anywhere
+        self.engine.select_feature(feature)
+        self.highlight_patch()
+
+        # Clear highlight from all other feature maps
+        for f, grid in self.fm_grids.items():
+            if f != feature:
+                grid.hide("cursor")
 
         # Update button colors
         for f, btn in self.filter_buttons.items():
             btn.config(bg="lightblue" if f == feature else "SystemButtonFace")
 
-        self.redraw_feature_map(feature)
-
-        # If cursor is already active, re-highlight on new feature map
-        if self.cursor_row is not None:
-            self.highlight_feature_cell(self.cursor_row, self.cursor_col)
+        if self.engine.row is not None:
+            self.highlight_feature_cell(self.engine.row, self.engine.col)
 
     # -------------------------------------------------
 
@@ -243,158 +340,169 @@ class ConvolutionGame:
             self.redraw_feature_map(f)
 
     def redraw_feature_map(self, feature):
-        canvas = self.fm_canvases[feature]
-        canvas.delete("cell")
-        for r in range(FM_SIZE):
-            for c in range(FM_SIZE):
-                color = self.user_maps[feature][r][c]
-                if color:
-                    canvas.create_rectangle(
-                        c*CELL_SIZE, r*CELL_SIZE,
-                        (c+1)*CELL_SIZE, (r+1)*CELL_SIZE,
-                        fill=color, outline="gray", tags="cell"
-                    )
+        self.fm_grids[feature].set_all(self.engine.map_states(feature))
 
-    # -------------------------------------------------
+    def update_cell(self, feature, r, c):
+        self.fm_grids[feature].fill(r, c, self.engine.state(feature, r, c))
 
-    def reveal_current_position(self):
-        if self.cursor_row is None:
-            return
-
-        f = self.selected_feature
-        truth = self.feature_maps[f][self.cursor_row][self.cursor_col]
-        color = "red" if truth else "blue"
+    # -------------------------------------------------
 
-        self.user_maps[f][self.cursor_row][self.cursor_col] = color
-        self.redraw_feature_map(f)
+    def show_cursor_cell(self):
+        """Redraw after the engine revealed the cell under the cursor."""
+        r, c = self.engine.row, self.engine.col
+        self.update_cell(self.engine.selected_feature, r, c)
         self.highlight_patch()
-        self.highlight_feature_cell(self.cursor_row, self.cursor_col)
-
+        self.highlight_feature_cell(r, c)
 
     # -------------------------------------------------
 
     def handle_image_click(self, event):
-        col = event.x // CELL_SIZE
-        row = event.y // CELL_SIZE
-
-        fm_row = row // STRIDE
-        fm_col = col // STRIDE
-
-        if not (0 <= fm_row < FM_SIZE and 0 <= fm_col < FM_SIZE):
+        cell = self.img_grid.cell_at(event.x, event.y)
+        if cell is None:
             return
-
-        self.cursor_row, self.cursor_col = fm_row, fm_col
-        self.reveal_current_position()
-        self.highlight_feature_cell(fm_row, fm_col)
-        self.saved_positions[self.selected_feature] = (fm_row, fm_col)
-
-
+        row, col = cell
+        self.record("click", row, col)
+        if self.engine.click(row, col) is not None:
+            self.show_cursor_cell()
 
     # -------------------------------------------------
     # Arrow key movement
     # -------------------------------------------------
 
     def move_left(self, event):
-        if self.cursor_col is not None and self.cursor_col > 0:
-            self.cursor_col -= 1
-            self.reveal_current_position()
-            self.highlight_feature_cell(self.cursor_row, self.cursor_col)
-            self.saved_positions[self.selected_feature] = (self.cursor_row, self.cursor_col)
-
-
+        self.record("move", 0, -1)
+        if self.engine.move_left():
+            self.show_cursor_cell()
 
     def move_right(self, event):
-        if self.cursor_col is not None and self.cursor_col < FM_SIZE - 1:
-            self.cursor_col += 1
-            self.reveal_current_position()
-            self.highlight_feature_cell(self.cursor_row, self.cursor_col)
-            self.saved_positions[self.selected_feature] = (self.cursor_row, self.cursor_col)
-
-
+        self.record("move", 0, 1)
+        if self.engine.move_right():
+            self.show_cursor_cell()
 
     def move_up(self, event):
-        if self.cursor_row is not None and self.cursor_row > 0:
-            self.cursor_row -= 1
-            self.reveal_current_position()
-            self.highlight_feature_cell(self.cursor_row, self.cursor_col)
-            self.saved_positions[self.selected_feature] = (self.cursor_row, self.cursor_col)
-
-
+        self.record("move", -1, 0)
+        if self.engine.move_up():
+            self.show_cursor_cell()
 
     def move_down(self, event):
-        if self.cursor_row is not None and self.cursor_row < FM_SIZE - 1:
-            self.cursor_row += 1
-            self.reveal_current_position()
-            self.highlight_feature_cell(self.cursor_row, self.cursor_col)
-            self.saved_positions[self.selected_feature] = (self.cursor_row, self.cursor_col)
-
-
+        self.record("move", 1, 0)
+        if self.engine.move_down():
+            self.show_cursor_cell()
 
     # -------------------------------------------------
 
     def highlight_patch(self):
-        self.img_canvas.delete("patch")
-        if self.cursor_row is None:
+        if self.engine.row is None:
+            self.img_grid.hide("patch")
             return
 
-        top = self.cursor_row * STRIDE
-        left = self.cursor_col * STRIDE
-
-        self.img_canvas.create_rectangle(
-            left * CELL_SIZE,
-            top * CELL_SIZE,
-            (left + FILTER_SIZE) * CELL_SIZE,
-            (top + FILTER_SIZE) * CELL_SIZE,
-            outline="yellow",
-            width=3,
-            tags="patch"
-        )
+        # The patch outline is a single item that just moves around
+        top = self.engine.row * STRIDE - PADDING
+        left = self.engine.col * STRIDE - PADDING
+        self.img_grid.overlay("patch", top, left, FILTER_SIZE, FILTER_SIZE,
+                              outline="yellow", width=3)
+
     def highlight_feature_cell(self, r, c):
         """Highlight the (r,c) cell in the currently selected feature map."""
-        canvas = self.fm_canvases[self.selected_feature]
-
-        # Remove previous highlight on this feature map
-        canvas.delete("fm_patch")
-
-        # Draw the yellow outline
-        canvas.create_rectangle(
-            c * CELL_SIZE,
-            r * CELL_SIZE,
-            (c + 1) * CELL_SIZE,
-            (r + 1) * CELL_SIZE,
-            outline="yellow",
-            width=3,
-            tags="fm_patch"
-        )
+        self.fm_grids[self.engine.selected_feature].overlay("cursor", r, c, outline="yellow", width=3)
+
+    # -------------------------------------------------
+    # Hints
+    # -------------------------------------------------
+
+    def show_hint(self):
+        """Move the cursor to the most informative unrevealed cell (see hints.py)."""
+        self.record("hint")
+        cell, _, remaining = self.hints.hint(self.animal.key, self.engine.masks())
+        if cell is None:
+            self.feedback_label.config(text="No more hints: you can guess now!", fg="gray25")
+            return
+        f, r, c = cell
+        self.engine.place_cursor(f, r, c)
+        self.select_feature(f)
+        self.feedback_label.config(
+            text=f"Hint: try here on the {f} map ({remaining} animals still possible)", fg="gray25")
 
     # -------------------------------------------------
     # Guessing logic
     # -------------------------------------------------
 
     def check_guess(self):
-        guess = self.guess_entry.get().strip().lower()
-
-        if guess == "giraffe":
+        guess = self.guess_entry.get()
+        self.record("guess", guess)
+        if self.engine.check_guess(guess):
             self.feedback_label.config(text="Correct!", fg="green")
             self.reveal_image()
         else:
             self.feedback_label.config(text="❌ Incorrect!", fg="red")
 
     def reveal_image(self):
-        if not self.giraffe_img_tk:
-            self.feedback_label.config(text="(Missing giraffe2.png)", fg="orange")
+        self.image_revealed = True
+        path = self.image_path(self.animal)
+        photo = self.images.get(path)
+        if photo is None:
+            # Placeholder until the worker thread has the image ready
+            self.img_canvas.create_text(
+                self.images.size // 2, self.images.size // 2,
+                text="Loading image...", fill="white", font=("Arial", 18), tags="loading"
+            )
+            key = self.animal.key
+            self.images.request(path, lambda p: self.show_image(p, key))
+            return
+        self.show_image(photo, self.animal.key)
+
+    def show_image(self, photo, key):
+        if key != self.animal.key or not self.image_revealed:
+            return  # the student moved on to another animal meanwhile
+        if photo is None:
+            self.img_canvas.delete("loading")
+            self.feedback_label.config(text=f"(Missing {self.animal.image})", fg="orange")
             return
 
-        self.image_revealed = True
-        self.img_canvas.delete("all")
+        self.img_canvas.delete("loading")
+        self.img_grid.hide("patch")
 
         self.img_canvas.create_image(
-            0, 0, anchor="nw", image=self.giraffe_img_tk
+            0, 0, anchor="nw", image=photo, tags="photo"
         )
 
-        self.img_canvas.image = self.giraffe_img_tk  # prevent garbage collection
-
-
-root = tk.Tk()
-game = ConvolutionGame(root)
-root.mainloop()
+        self.img_canvas.image = photo  # prevent garbage collection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="The convolution guessing game")
+    parser.add_argument("--record", metavar="PATH", help="log every input here, see recording.py")
+    parser.add_argument("--profile", default="default", help="whose saved game to resume, see saves.py")
+    parser.add_argument("--profiles", action="store_true", help="list the saved profiles and exit")
+    parser.add_argument("--no-save", action="store_true", help="don't resume or save progress")
+    parser.add_argument("--renderer", choices=("auto", "canvas", "raster"), default="auto",
+                        help="raster draws grids into zoomable images, for big grids")
+    args = parser.parse_args()
+
+    from saves import SaveStore
+    if args.profiles:
+        print("\n".join(SaveStore().profiles()))
+        raise SystemExit
+    saves = None if args.no_save else SaveStore()
+
+    recorder = None
+    if args.record:
+        from recording import Recorder
+        recorder = Recorder(args.record)
+
+    root = tk.Tk()
+    game = ConvolutionGame(root, recorder=recorder, saves=saves, profile=args.profile,
+                           renderer=args.renderer)
+
+    def close():
+        # Write whatever is still waiting for a pause
+        game.save_now()
+        root.destroy()
+    root.protocol("WM_DELETE_WINDOW", close)
+    try:
+        root.mainloop()
+    finally:
+        if saves is not None:
+            saves.close()
+        if recorder is not None:
+            recorder.close()
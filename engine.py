@@ -0,0 +1,200 @@
+"""The game for one animal, without any UI.
+
+GameEngine holds everything a student can do to one animal: pick a feature
+map, click an image cell or move with the arrow keys (either reveals the
+feature map cell under the filter), and guess. ConvolutionGame draws it with
+Tk and GameStateStore keeps one per browser session and animal, so both
+follow the same rules. Nothing here needs a display, so it can be driven
+from simulations, tests and bench.py.
+
+State is kept small: the animal's true maps are one shared bytes object per
+animal (one byte per feature map cell, 0 or 1) and the student's view is a
+bytearray of the same shape holding HIDDEN, BLUE or RED. pack_cells() stores
+that in 2 bits per cell, for saves.py.
+"""
+from bitmaps import array_to_map, map_to_array
+from convcore import FEATURES, FM_SIZE, PADDING, STRIDE
+
+import numpy as np
+
+HIDDEN, BLUE, RED = 0, 1, 2         # a revealed cell is truth + 1
+COLORS = (None, "blue", "red")
+
+GUESS_MAX = 64
+NO_POSITION = 0xFFFF                # a feature map the cursor hasn't been on, in saves
+
+_truth_cache = {}
+
+
+def truth_cells(animal, features=FEATURES, size=FM_SIZE):
+    """animal's maps as bytes, feature-major, shared by every engine for it."""
+    cache_key = (animal.key, animal.signature, tuple(features), size)
+    truth = _truth_cache.get(cache_key)
+    if truth is None:
+        if len(_truth_cache) >= 4096:
+            _truth_cache.clear()
+        truth = _truth_cache[cache_key] = b"".join(
+            map_to_array(animal.maps.get(f, 0), size).astype(np.uint8).tobytes() for f in features)
+    return truth
+
+
+def pack_cells(cells):
+    """HIDDEN/BLUE/RED per cell -> bytes, 2 bits per cell, first cell in the low bits."""
+    a = np.frombuffer(bytes(cells), dtype=np.uint8)
+    a = np.concatenate([a, np.zeros(-len(a) % 4, dtype=np.uint8)]).reshape(-1, 4)
+    return (a[:, 0] | a[:, 1] << 2 | a[:, 2] << 4 | a[:, 3] << 6).tobytes()
+
+
+def unpack_cells(data, n):
+    a = np.frombuffer(data, dtype=np.uint8)
+    return (a[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8) & 3).ravel()[:n]
+
+
+def normalize_guess(text):
+    return text.strip().lower()[:GUESS_MAX]
+
+
+class GameEngine:
+    __slots__ = ("key", "answer", "features", "size", "truth", "cells",
+                 "feature", "row", "col", "saved", "correct", "guess")
+
+    def __init__(self, animal, features=FEATURES, size=FM_SIZE):
+        self.key = animal.key
+        self.answer = normalize_guess(animal.name)
+        self.features = features
+        self.size = size
+        self.truth = truth_cells(animal, features, size)
+        self.cells = bytearray(len(self.truth))
+        self.feature = 0                    # index into features
+        self.row = None                     # cursor on the feature map, None until placed
+        self.col = None
+        self.saved = [None] * len(features)     # last (r, c) per feature map
+        self.correct = False
+        self.guess = ""
+
+    # -------------------------------------------------
+
+    @property
+    def selected_feature(self):
+        return self.features[self.feature]
+
+    def select_feature(self, feature):
+        """Switch feature map; the cursor goes back to where it was on that map."""
+        self.feature = self.features.index(feature)
+        saved = self.saved[self.feature]
+        self.row, self.col = saved if saved is not None else (None, None)
+
+    def place_cursor(self, feature, r, c):
+        """Select feature with the cursor at (r, c), without revealing anything."""
+        self.feature = self.features.index(feature)
+        self.saved[self.feature] = (r, c)
+        self.row, self.col = r, c
+
+    def reveal_at(self, r, c):
+        """Move the cursor to (r, c) on the selected map and reveal it. True if it was hidden."""
+        i = self.feature * self.size * self.size + r * self.size + c
+        new = not self.cells[i]
+        self.cells[i] = self.truth[i] + 1
+        self.row, self.col = r, c
+        self.saved[self.feature] = (r, c)
+        return new
+
+    def reveal(self, feature, r, c):
+        """Reveal a cell of any map without touching the cursor (e.g. replayed progress)."""
+        i = self.features.index(feature) * self.size * self.size + r * self.size + c
+        new = not self.cells[i]
+        self.cells[i] = self.truth[i] + 1
+        return new
+
+    def click(self, img_row, img_col):
+        """A click on image cell (img_row, img_col): the feature map cell it falls in, or None."""
+        r = (img_row + PADDING) // STRIDE
+        c = (img_col + PADDING) // STRIDE
+        if not (0 <= r < self.size and 0 <= c < self.size):
+            return None
+        self.reveal_at(r, c)
+        return r, c
+
+    def move(self, dr, dc):
+        """Arrow keys: step the cursor and reveal. False (and no change) at the edge or with no cursor."""
+        if self.row is None:
+            return False
+        r, c = self.row + dr, self.col + dc
+        if not (0 <= r < self.size and 0 <= c < self.size):
+            return False
+        self.reveal_at(r, c)
+        return True
+
+    def move_left(self):
+        return self.move(0, -1)
+
+    def move_right(self):
+        return self.move(0, 1)
+
+    def move_up(self):
+        return self.move(-1, 0)
+
+    def move_down(self):
+        return self.move(1, 0)
+
+    def check_guess(self, text):
+        """Record a guess; True if it names the animal."""
+        self.guess = normalize_guess(text)
+        right = self.guess == self.answer
+        self.correct = self.correct or right
+        return right
+
+    # -------------------------------------------------
+
+    def save_state(self):
+        """-> (cells, positions, correct, guess): packed 2-bit cells and the
+        saved cursor per feature as u16 row, col (NO_POSITION for none)."""
+        positions = np.array([p if p is not None else (NO_POSITION, NO_POSITION) for p in self.saved],
+                             dtype="<u2")
+        return pack_cells(self.cells), positions.tobytes(), self.correct, self.guess
+
+    def restore_state(self, cells, positions, correct, guess):
+        """Undo save_state(). Colours come from the animal's current maps, in
+        case they changed since."""
+        seen = unpack_cells(cells, len(self.cells)) != HIDDEN
+        if len(positions) == 2 * len(self.saved):
+            positions = np.frombuffer(positions, dtype=np.uint8)     # older saves: u8, 255 for none
+        elif len(positions) == 4 * len(self.saved):
+            positions = np.frombuffer(positions, dtype="<u2")
+        else:
+            raise ValueError("saved game is for a different board")
+        if len(seen) != len(self.cells):
+            raise ValueError("saved game is for a different board")
+        truth = np.frombuffer(self.truth, dtype=np.uint8)
+        self.cells[:] = np.where(seen, truth + 1, HIDDEN).astype(np.uint8).tobytes()
+        self.saved = [(int(r), int(c)) if r < self.size and c < self.size else None
+                      for r, c in zip(positions[::2], positions[1::2])]
+        saved = self.saved[self.feature]
+        self.row, self.col = saved if saved is not None else (None, None)
+        self.correct = bool(correct)
+        self.guess = guess
+
+    # -------------------------------------------------
+
+    def state(self, feature, r, c):
+        """HIDDEN, BLUE or RED for a cell of the named map."""
+        return self.cells[self.features.index(feature) * self.size * self.size + r * self.size + c]
+
+    def map_states(self, feature):
+        """(size, size) uint8 view of one map's cells, HIDDEN/BLUE/RED."""
+        n = self.size * self.size
+        i = self.features.index(feature)
+        return np.frombuffer(self.cells, dtype=np.uint8)[i * n:(i + 1) * n].reshape(self.size, self.size)
+
+    def color(self, feature, r, c):
+        return COLORS[self.state(feature, r, c)]
+
+    def revealed_count(self):
+        return len(self.cells) - self.cells.count(HIDDEN)
+
+    def masks(self):
+        """{feature: packed int of revealed cells}, see bitmaps.py."""
+        n = self.size * self.size
+        view = np.frombuffer(self.cells, dtype=np.uint8)
+        return {f: array_to_map(view[i * n:(i + 1) * n] != HIDDEN)
+                for i, f in enumerate(self.features)}
@@ -0,0 +1,124 @@
+"""In-process store for each browser's game progress.
+
+A session holds one engine.GameEngine per animal it has played, the same
+game the Tk frontend runs, so reveals and guesses follow the same rules
+everywhere. Its revealed cells are a bytearray and the animal's own maps are
+shared between engines, so an animal costs about a kilobyte. Sessions are kept
+in LRU order and dropped when idle for longer than `ttl` seconds, when there
+are more than `max_sessions`, or when the rough memory estimate goes over
+`max_bytes`.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from engine import GameEngine
+
+# Rough per-object costs used for the memory budget (CPython, 64-bit)
+SESSION_BYTES = 400
+ENGINE_BYTES = 350          # plus one byte per feature map cell
+
+
+class Session:
+    __slots__ = ("animals", "touched", "size")
+
+    def __init__(self, now):
+        self.animals = {}
+        self.touched = now
+        self.size = SESSION_BYTES
+
+
+class GameStateStore:
+    def __init__(self, max_sessions=20000, ttl=6 * 3600, max_bytes=64 * 1024 * 1024,
+                 clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.bytes = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _get(self, sid, create):
+        now = self.clock()
+        session = self._sessions.get(sid)
+        if session is not None and now - session.touched > self.ttl:
+            self._drop(sid)
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = Session(now)
+            self._sessions[sid] = session
+            self.bytes += session.size
+        else:
+            self._sessions.move_to_end(sid)
+            session.touched = now
+        return session
+
+    def _drop(self, sid):
+        session = self._sessions.pop(sid)
+        self.bytes -= session.size
+
+    def _evict(self):
+        now = self.clock()
+        # Least recently used first; stop at the first live session that fits
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            expired = now - session.touched > self.ttl
+            if not (expired or len(self._sessions) > self.max_sessions
+                    or self.bytes > self.max_bytes):
+                break
+            self._drop(sid)
+
+    def _engine(self, session, animal):
+        game = session.animals.get(animal.key)
+        if game is None:
+            game = session.animals[animal.key] = GameEngine(animal)
+            cost = ENGINE_BYTES + len(game.cells)
+            session.size += cost
+            self.bytes += cost
+        return game
+
+    def apply(self, sid, reveals=(), guesses=()):
+        """Record reveals [(animal, feature, r, c), ...] and guesses [(animal, text), ...].
+
+        animal is a registry.Animal. Returns (new_reveals, solved): the
+        reveals (by animal key) of cells that weren't revealed yet, and
+        [(key, cells revealed), ...] for animals this delta guessed
+        correctly for the first time.
+        """
+        new_reveals = []
+        solved = []
+        with self._lock:
+            session = self._get(sid, create=True)
+            for animal, feature, r, c in reveals:
+                if self._engine(session, animal).reveal(feature, r, c):
+                    new_reveals.append((animal.key, feature, r, c))
+            for animal, text in guesses:
+                game = self._engine(session, animal)
+                was_correct = game.correct
+                if game.check_guess(text) and not was_correct:
+                    solved.append((animal.key, game.revealed_count()))
+            self._evict()
+        return new_reveals, solved
+
+    def snapshot(self, sid):
+        """{animal: {"masks": {feature: int}, "correct": bool, "guess": str}} or None."""
+        with self._lock:
+            session = self._get(sid, create=False)
+            if session is None:
+                return None
+            return {
+                key: {"masks": {f: m for f, m in game.masks().items() if m},
+                      "correct": game.correct, "guess": game.guess}
+                for key, game in session.animals.items()
+            }
+
+    def forget(self, sid):
+        with self._lock:
+            if sid in self._sessions:
+                self._drop(sid)
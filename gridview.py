@@ -0,0 +1,204 @@
+"""The two ways the Tk game can draw a grid of cells.
+
+CanvasGrid is one canvas rectangle per cell, recoloured with itemconfig. It
+is simple and looks right at the game's 30x30 image and 10x10 maps, but
+every cell is a canvas item, so the item count (and startup time, and Tk's
+redraw cost) grows with the square of the grid size.
+
+RasterGrid paints the cells into one PhotoImage instead. Only the part of
+the grid inside the viewport is rendered (with numpy, one paste per zoom or
+pan), and revealing a cell repaints just that cell's rectangle of the
+image, so a 300x300 grid costs the same as a 30x30 one. The mouse wheel
+zooms around the pointer and dragging with the right (or middle) button pans.
+
+Both take cell values as indexes into a palette (engine.COLORS for the
+feature maps, None meaning "not filled") and draw named overlay rectangles
+(the filter outline, the cursor) that follow zoom and pan:
+
+    grid = RasterGrid(canvas, 100, 100, cell_size=2, palette=COLORS)
+    grid.set_all(states)                  # (rows, cols) of palette indexes
+    grid.fill(3, 4, RED)
+    grid.overlay("cursor", 3, 4, outline="yellow", width=3)
+    grid.cell_at(event.x, event.y)        # -> (row, col) or None
+"""
+import numpy as np
+from PIL import Image, ImageColor, ImageTk
+
+from maprender import MIN_LINES_PX, render_view
+
+LINE_COLOR = "gray"
+MAX_CELL_PX = 64
+
+
+def fit(size, max_px, cell_px):
+    """(cell size, viewport size) in pixels for a size x size grid shown at most max_px wide."""
+    cell = max(1, min(cell_px, max_px // size))
+    return cell, size * cell
+
+
+class CanvasGrid:
+    """One canvas rectangle per cell."""
+
+    def __init__(self, canvas, rows, cols, cell_size, palette):
+        self.canvas = canvas
+        self.rows = rows
+        self.cols = cols
+        self.cell_size = cell_size
+        self.palette = palette
+        self.overlays = {}
+        self.items = [
+            [canvas.create_rectangle(
+                j * cell_size, i * cell_size,
+                (j + 1) * cell_size, (i + 1) * cell_size,
+                outline=LINE_COLOR
+            ) for j in range(cols)]
+            for i in range(rows)
+        ]
+
+    def fill(self, r, c, value):
+        self.canvas.itemconfig(self.items[r][c], fill=self.palette[value] or "")
+
+    def set_all(self, values):
+        for r in range(self.rows):
+            for c in range(self.cols):
+                self.fill(r, c, values[r][c])
+
+    def cell_at(self, x, y):
+        r, c = y // self.cell_size, x // self.cell_size
+        return (r, c) if 0 <= r < self.rows and 0 <= c < self.cols else None
+
+    def point_of(self, r, c):
+        """Canvas (x, y) of the middle of cell (r, c)."""
+        return (c * self.cell_size + self.cell_size // 2, r * self.cell_size + self.cell_size // 2)
+
+    def _box(self, r, c, rows, cols):
+        s = self.cell_size
+        return c * s, r * s, (c + cols) * s, (r + rows) * s
+
+    def overlay(self, name, r, c, rows=1, cols=1, **options):
+        """Show rectangle `name` around rows x cols cells from (r, c), on top."""
+        coords = self._box(r, c, rows, cols)
+        item = self.overlays.get(name, (None,))[0]
+        if item is None:
+            item = self.canvas.create_rectangle(*coords, **options)
+        else:
+            self.canvas.coords(item, *coords)
+            self.canvas.itemconfig(item, state="normal")
+        self.canvas.tag_raise(item)
+        self.overlays[name] = (item, r, c, rows, cols)
+
+    def hide(self, name):
+        if name in self.overlays:
+            self.canvas.itemconfig(self.overlays[name][0], state="hidden")
+
+
+class RasterGrid(CanvasGrid):
+    """The grid painted into one PhotoImage, with zoom, pan and viewport culling."""
+
+    def __init__(self, canvas, rows, cols, cell_size, palette, width=None, height=None,
+                 background="white"):
+        self.canvas = canvas
+        self.rows = rows
+        self.cols = cols
+        self.cell_size = cell_size
+        self.palette = palette
+        self.overlays = {}
+        self.width = width or cols * cell_size
+        self.height = height or rows * cell_size
+        self.left = 0       # viewport position on the whole grid, in pixels
+        self.top = 0
+        self.values = np.zeros((rows, cols), dtype=np.uint8)
+        self._rgb = np.array([ImageColor.getrgb(color or background) for color in palette],
+                             dtype=np.uint8)
+        self._hex = ["#%02x%02x%02x" % tuple(rgb) for rgb in self._rgb]
+        self._line = np.array(ImageColor.getrgb(LINE_COLOR), dtype=np.uint8)
+        self._outside = np.array(ImageColor.getrgb(background), dtype=np.uint8)
+        self.photo = ImageTk.PhotoImage("RGB", (self.width, self.height))
+        self.image_item = canvas.create_image(0, 0, anchor="nw", image=self.photo)
+        self.render()
+
+    # -------------------------------------------------
+
+    def render(self):
+        """Repaint the whole viewport (after zoom, pan or set_all)."""
+        view = render_view(self.values, self._rgb, self.cell_size, self.top, self.left,
+                           self.width, self.height, self._line, self._outside)
+        self.photo.paste(Image.fromarray(view))
+        for name, (item, r, c, rows, cols) in self.overlays.items():
+            self.canvas.coords(item, *self._box(r, c, rows, cols))
+
+    def fill(self, r, c, value):
+        self.values[r, c] = value
+        s = self.cell_size
+        inset = 1 if s >= MIN_LINES_PX else 0
+        x0 = max(0, c * s - self.left + inset)
+        y0 = max(0, r * s - self.top + inset)
+        x1 = min(self.width, (c + 1) * s - self.left)
+        y1 = min(self.height, (r + 1) * s - self.top)
+        if x0 < x1 and y0 < y1:
+            # Off-screen cells are only drawn by the next render()
+            self.canvas.tk.call(str(self.photo), "put", self._hex[value], "-to", x0, y0, x1, y1)
+
+    def set_all(self, values):
+        self.values[:] = values
+        self.render()
+
+    # -------------------------------------------------
+
+    def cell_at(self, x, y):
+        return CanvasGrid.cell_at(self, x + self.left, y + self.top)
+
+    def point_of(self, r, c):
+        x, y = CanvasGrid.point_of(self, r, c)
+        return x - self.left, y - self.top
+
+    def _box(self, r, c, rows, cols):
+        x0, y0, x1, y1 = CanvasGrid._box(self, r, c, rows, cols)
+        return x0 - self.left, y0 - self.top, x1 - self.left, y1 - self.top
+
+    def _clamp(self):
+        self.left = max(0, min(self.left, self.cols * self.cell_size - self.width))
+        self.top = max(0, min(self.top, self.rows * self.cell_size - self.height))
+
+    def zoom(self, factor, x=0, y=0):
+        """Scale cells by factor, keeping the grid point under canvas (x, y) in place."""
+        old = self.cell_size
+        fit = max(1, min(self.width // self.cols, self.height // self.rows))
+        new = max(fit, min(MAX_CELL_PX, round(old * factor)))
+        if new == old:
+            new = max(fit, min(MAX_CELL_PX, old + (1 if factor > 1 else -1)))
+            if new == old:
+                return
+        self.left = (self.left + x) * new // old - x
+        self.top = (self.top + y) * new // old - y
+        self.cell_size = new
+        self._clamp()
+        self.render()
+
+    def pan(self, dx, dy):
+        left, top = self.left, self.top
+        self.left -= dx
+        self.top -= dy
+        self._clamp()
+        if (left, top) != (self.left, self.top):
+            self.render()
+
+    def bind_navigation(self):
+        """Mouse wheel zooms, right or middle button drag pans."""
+        canvas = self.canvas
+        canvas.bind("<MouseWheel>", lambda e: self.zoom(1.25 if e.delta > 0 else 0.8, e.x, e.y))
+        canvas.bind("<Button-4>", lambda e: self.zoom(1.25, e.x, e.y))     # X11
+        canvas.bind("<Button-5>", lambda e: self.zoom(0.8, e.x, e.y))
+        drag = {}
+
+        def start(event):
+            drag["at"] = (event.x, event.y)
+
+        def move(event):
+            x, y = drag.get("at", (event.x, event.y))
+            drag["at"] = (event.x, event.y)
+            self.pan(event.x - x, event.y - y)
+
+        for button in (2, 3):
+            canvas.bind(f"<ButtonPress-{button}>", start)
+            canvas.bind(f"<B{button}-Motion>", move)
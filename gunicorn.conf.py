@@ -0,0 +1,45 @@
+"""gunicorn settings for GuessAnimal.
+
+    gunicorn -c gunicorn.conf.py
+
+Everything can be overridden from the environment:
+
+    GUESSANIMAL_BIND          address to listen on (0.0.0.0:8000)
+    GUESSANIMAL_WORKER_CLASS  gthread (default) or gevent (pip install gevent)
+    GUESSANIMAL_WORKERS       worker processes (1, see below)
+    GUESSANIMAL_THREADS       threads per gthread worker (16)
+    GUESSANIMAL_CONNECTIONS   open connections per gevent worker (1000)
+    GUESSANIMAL_KEEPALIVE     seconds to keep an idle connection open (5)
+    GUESSANIMAL_TIMEOUT       seconds before a stuck worker is restarted (30)
+
+Game progress (/api/state) lives in the worker's memory, so with more than
+one worker a student's requests must keep reaching the same worker (e.g.
+sticky sessions on the load balancer). One worker with threads or gevent
+handles a classroom comfortably; see README.md for numbers.
+"""
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("GUESSANIMAL_BIND", "0.0.0.0:8000")
+
+worker_class = os.environ.get("GUESSANIMAL_WORKER_CLASS", "gthread")
+workers = _env_int("GUESSANIMAL_WORKERS", 1)
+threads = _env_int("GUESSANIMAL_THREADS", 16)
+worker_connections = _env_int("GUESSANIMAL_CONNECTIONS", 1000)
+keepalive = _env_int("GUESSANIMAL_KEEPALIVE", 5)
+timeout = _env_int("GUESSANIMAL_TIMEOUT", 30)
+graceful_timeout = timeout
+
+# Load animals, images and the index page once in the master (see wsgi.py)
+preload_app = True
+
+if worker_class == "gevent":
+    # Patch before the app is preloaded, so the locks and sockets it creates
+    # are the cooperative kind
+    from gevent import monkey
+    monkey.patch_all()
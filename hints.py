@@ -0,0 +1,52 @@
+"""Which cell to reveal next.
+
+The animals still possible are the ones whose maps agree with every cell the
+student has revealed so far. Revealing another cell splits them into the
+ones with a 1 there and the ones with a 0, so the most informative reveal is
+the unrevealed cell that splits them most evenly (the split's entropy is the
+expected information gain, in bits).
+
+The split of every cell is one AND plus a popcount over catalogindex's
+inverted index, so a hint for 10k animals takes a fraction of a millisecond.
+
+    hints = CatalogHints(LiveIndex(registry))
+    hints.hint("animal1", {"eye": revealed_mask, ...})
+    # -> (("ear", 3, 4), 0.97, 12)   cell or None, gain in bits, animals left
+"""
+import numpy as np
+
+
+def best_reveal(index, cells, candidates, remaining):
+    """(flat cell, gain in bits) of the unrevealed cell that best splits candidates, or (None, 0)."""
+    ones = np.bitwise_count(index.columns & candidates).sum(axis=1)
+    p = ones / max(remaining, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain = -(np.where(p > 0, p * np.log2(p), 0) + np.where(p < 1, (1 - p) * np.log2(1 - p), 0))
+    gain[cells] = -1
+    best = int(gain.argmax())
+    if gain[best] <= 0:
+        # Nothing left to tell apart (or only look-alikes)
+        return None, 0.0
+    return best, float(gain[best])
+
+
+class CatalogHints:
+    """Hints over a catalogindex.LiveIndex, so always over the registry's current animals."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def hint(self, key, masks):
+        """((feature, r, c) or None, gain in bits, animals still possible) for key's reveals."""
+        index = self.catalog.get()
+        if key not in index:
+            raise KeyError(key)
+        cells = index.revealed_cells(masks)
+        candidates = index.consistent(cells, index.values_of(key, cells))
+        remaining = index.count(candidates)
+        best, gain = best_reveal(index, cells, candidates, remaining)
+        if best is None:
+            return None, 0.0, remaining
+        feature, cell = divmod(best, index.cells)
+        r, c = divmod(cell, index.size)
+        return (index.features[feature], r, c), gain, remaining
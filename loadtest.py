@@ -0,0 +1,82 @@
+"""Rough load test against a running server.
+
+    GUESSANIMAL_EVENT_DIR=$(mktemp -d) gunicorn -c gunicorn.conf.py &
+    python loadtest.py --clients 50 --duration 20
+
+Each client keeps one HTTP/1.1 connection open and loops over a typical
+student's requests: revalidating the page, opening an animal and syncing a
+click. Prints requests per second and latency percentiles per path.
+
+The syncs are recorded like a real student's reveals, so run the server
+against a throwaway event log as above, never the one the classroom's
+statistics come from.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+
+def client_loop(host, port, deadline, results):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    sid = uuid.uuid4().hex
+    state_body = json.dumps({"r": [["animal1", "eye", 0, 0]]})
+
+    def call(method, path, body=None, headers=None):
+        start = time.perf_counter()
+        conn.request(method, path, body, headers or {})
+        resp = conn.getresponse()
+        resp.read()
+        results.setdefault(method + " " + path.split("?")[0].replace(sid, "<sid>"), []).append(
+            (time.perf_counter() - start, resp.status))
+        return resp
+
+    tag = call("GET", "/", headers={"Accept-Encoding": "gzip"}).getheader("ETag")
+    while time.perf_counter() < deadline:
+        call("GET", "/", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+        call("GET", "/api/animals")
+        call("GET", "/api/animals/animal2")
+        call("POST", f"/api/state/{sid}", state_body, {"Content-Type": "application/json"})
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args(argv)
+    url = urlsplit(args.url)
+
+    deadline = time.perf_counter() + args.duration
+    per_client = [{} for _ in range(args.clients)]
+    threads = [threading.Thread(target=client_loop, args=(url.hostname, url.port or 80, deadline, r))
+               for r in per_client]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    merged = {}
+    for results in per_client:
+        for path, samples in results.items():
+            merged.setdefault(path, []).extend(samples)
+
+    total = sum(len(s) for s in merged.values())
+    print(f"{args.clients} clients, {elapsed:.1f} s: {total} requests, {total / elapsed:.0f} req/s")
+    print(f"{'request':32} {'count':>7} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for path, samples in sorted(merged.items()):
+        times = sorted(t for t, _ in samples)
+        errors = sum(1 for _, status in samples if status >= 400)
+        q = statistics.quantiles(times, n=100) if len(times) > 1 else times * 99
+        print(f"{path:32} {len(times):7} {errors:7} {q[49] * 1e3:7.1f}ms {q[94] * 1e3:7.1f}ms {q[98] * 1e3:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Feature maps drawn to small PNGs on the server.
+
+For browsers where redrawing the maps on a canvas after every click is slow
+(see GET /api/render/... in app.py): the map a student sees is fully
+determined by the animal's map, which cells they have revealed and the cell
+size, so it can be rendered once and cached, on the server and in the
+browser, under a URL naming exactly those.
+
+The PNG looks like app.js's drawFeatureMap(): white cells with grey
+outlines, revealed cells filled red (the feature is there) or blue. It is
+palette-based, so a 10x10 map is a few hundred bytes.
+
+    png = render_png(truth_bits, revealed_bits, size=10, cell=17)
+    cache = PngCache(max_bytes=8 << 20)
+    cache.get(key) / cache.put(key, png)
+"""
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+import bitmaps
+
+MIN_LINES_PX = 4        # no grid lines when cells are smaller than this
+
+# Palette: background, blue (revealed 0), red (revealed 1), grid lines
+WHITE, BLUE, RED, LINE = range(4)
+PALETTE = [255, 255, 255, 0, 0, 255, 255, 0, 0, 0x99, 0x99, 0x99]
+
+
+def render_view(values, colors, cell, top, left, width, height, line, outside):
+    """Pixels (height x width, plus colors' trailing shape) of the grid of
+    palette indexes `values` seen from (top, left), with cell x cell pixel
+    cells. Only the visible cells are expanded."""
+    rows, cols = values.shape
+    r0, c0 = top // cell, left // cell
+    r1 = min(rows, -(-(top + height) // cell))
+    c1 = min(cols, -(-(left + width) // cell))
+
+    pixels = colors[values[r0:r1, c0:c1]].repeat(cell, axis=0).repeat(cell, axis=1)
+    pixels = pixels[top - r0 * cell:, left - c0 * cell:][:height, :width]
+    view = np.empty((height, width) + colors.shape[1:], dtype=colors.dtype)
+    view[:] = outside
+    h, w = pixels.shape[:2]
+    view[:h, :w] = pixels
+
+    if cell >= MIN_LINES_PX:
+        ys = np.arange(min(height, rows * cell - top + 1))
+        xs = np.arange(min(width, cols * cell - left + 1))
+        view[ys[(ys + top) % cell == 0], :len(xs)] = line
+        view[:len(ys), xs[(xs + left) % cell == 0]] = line
+    return view
+
+
+def render_png(truth, revealed, size, cell):
+    """PNG bytes of one feature map: truth and revealed are packed ints (see bitmaps.py)."""
+    truth = bitmaps.map_to_array(truth, size)
+    revealed = bitmaps.map_to_array(revealed, size)
+    values = np.where(revealed, np.where(truth, RED, BLUE), WHITE).astype(np.uint8)
+    px = size * cell + 1    # + 1 for the closing grid line
+    view = render_view(values, np.arange(3, dtype=np.uint8), cell, 0, 0, px, px, LINE, WHITE)
+    img = Image.fromarray(view, "P")
+    img.putpalette(PALETTE)
+    out = io.BytesIO()
+    img.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+class PngCache:
+    """LRU of rendered PNGs, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._items.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[key] = png
+            self.bytes += len(png)
+            while self.bytes > self.max_bytes and self._items:
+                _, dropped = self._items.popitem(last=False)
+                self.bytes -= len(dropped)
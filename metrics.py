@@ -0,0 +1,183 @@
+"""Request metrics in Prometheus text format.
+
+    metrics.init_app(app)     # records every request; serves GET /metrics
+
+Per route (the URL rule, so /api/state/<sid> is one series): a latency
+histogram, a response size histogram and a request counter by status, plus
+the time spent rendering each template and the number of requests in flight.
+
+Recording must not slow requests down, so there is no lock on the hot path:
+each thread writes only to its own shard (a few dicts) and /metrics adds the
+shards up. Numbers are per process; with several gunicorn workers each scrape
+sees the worker that answered it.
+"""
+import bisect
+import threading
+import time
+
+try:
+    # Under gevent's monkey patching get_ident() is per greenlet; shards should
+    # stay per OS thread or every connection would leave one behind
+    from gevent.monkey import get_original
+    get_ident = get_original("_thread", "get_ident")
+except ImportError:
+    from _thread import get_ident
+
+from flask import Response, g, request, before_render_template, template_rendered
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PREFIX = "guessanimal_"
+
+# name: (type, help, buckets or None)
+SERIES = {
+    "request_duration_seconds": ("histogram", "Time from routing to response, by route.", LATENCY_BUCKETS),
+    "response_size_bytes": ("histogram", "Response body size, by route (streamed bodies excluded).", SIZE_BUCKETS),
+    "template_render_seconds": ("histogram", "Time spent rendering a template.", LATENCY_BUCKETS),
+    "responses_total": ("counter", "Responses sent, by route and status.", None),
+    "requests_in_flight": ("gauge", "Requests currently being handled.", None),
+}
+
+
+class Shard:
+    __slots__ = ("histograms", "counters")
+
+    def __init__(self):
+        self.histograms = {}    # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.counters = {}      # (name, labels) -> value
+
+
+class Metrics:
+    def __init__(self):
+        self._shards = {}                      # thread id -> Shard
+        self._shards_lock = threading.Lock()   # only taken the first time a thread records
+
+    def _shard(self):
+        ident = get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.setdefault(ident, Shard())
+        return shard
+
+    def observe(self, name, labels, value):
+        buckets = SERIES[name][2]
+        histograms = self._shard().histograms
+        key = (name, labels)
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = [0] * (len(buckets) + 2)
+        hist[bisect.bisect_left(buckets, value)] += 1
+        hist[-1] += value
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    # -------------------------------------------------
+
+    def collect(self):
+        """Add up every thread's shard -> (histograms, counters)."""
+        with self._shards_lock:
+            shards = list(self._shards.values())
+        histograms, counters = {}, {}
+        for shard in shards:
+            # Copying a dict is atomic under the GIL, so a thread adding a
+            # series meanwhile can't break the iteration
+            for key, hist in dict(shard.histograms).items():
+                total = histograms.setdefault(key, [0] * len(hist))
+                for i, v in enumerate(list(hist)):
+                    total[i] += v
+            for key, value in dict(shard.counters).items():
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    def render(self):
+        histograms, counters = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in SERIES.items():
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            if buckets is None:
+                for (series, labels), value in sorted(counters.items()):
+                    if series == name:
+                        lines.append(f"{PREFIX}{name}{format_labels(labels)} {value:g}")
+                continue
+            for (series, labels), hist in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), hist[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else f"{bound:g}"
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {hist[-1]:.6f}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+# -------------------------------------------------
+# Flask wiring
+# -------------------------------------------------
+
+def route_labels():
+    # The URL rule rather than the path, so ids don't make a series each
+    rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    return (("route", rule), ("method", request.method))
+
+
+def init_app(app, metrics=None):
+    metrics = metrics or Metrics()
+    app.extensions["metrics"] = metrics
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_in_flight = True
+        metrics.inc("requests_in_flight")
+
+    @app.after_request
+    def record_response(resp):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            labels = route_labels()
+            metrics.observe("request_duration_seconds", labels, time.perf_counter() - start)
+            if not resp.is_streamed:
+                metrics.observe("response_size_bytes", labels, resp.content_length or 0)
+            metrics.inc("responses_total", labels + (("status", resp.status_code),))
+        return resp
+
+    @app.teardown_request
+    def end_request(exc):
+        if g.pop("metrics_in_flight", False):
+            metrics.inc("requests_in_flight", value=-1)
+
+    def render_started(sender, template, context, **extra):
+        g.setdefault("metrics_render_start", []).append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        starts = g.get("metrics_render_start")
+        if starts:
+            metrics.observe("template_render_seconds", (("template", template.name),),
+                            time.perf_counter() - starts.pop())
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return metrics
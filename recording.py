@@ -0,0 +1,428 @@
+"""Recording a student's inputs and replaying them without anyone at the keyboard.
+
+    python convolutiongame.py --record lesson.garc       # play; every input is logged
+    python recording.py show lesson.garc
+    python recording.py replay lesson.garc               # as fast as possible, on engine.py
+    python recording.py replay lesson.garc --speed 1     # at the pace it was played
+    python recording.py replay lesson.garc --target web --repeat 20
+    python recording.py replay lesson.garc --target tk   # the real window (needs a display)
+
+A recording is the inputs, not their results: choosing an animal or a
+feature map, clicking an image cell, arrow keys, hints and guesses. Replaying
+one re-runs the game logic, so the same log works as a regression run for
+engine.GameEngine, the Tkinter game and the web server (through Flask's test
+client, posting the progress syncs and hint requests the browser would).
+
+Layout (little-endian):
+
+    b"GARC" u16 version  u64 start (unix ms)  u8 n_features  n_features x str
+    then events: u8 op  varint ms since the previous event  payload
+
+    ANIMAL str key | FEATURE u8 index | CLICK varint row varint col (image cell)
+    LEFT, RIGHT, UP, DOWN, HINT (no payload) | GUESS str text
+
+where str is u16 length + UTF-8. A click or key press is 2-4 bytes on grids
+up to 128 cells wide. Version 1 recordings (u8 click row and col) still read.
+"""
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from assets import STATIC_DIR
+from convcore import FEATURES
+
+MAGIC = b"GARC"
+VERSION = 2
+
+ANIMAL, FEATURE, CLICK, LEFT, RIGHT, UP, DOWN, GUESS, HINT = range(9)
+OP_NAMES = ("animal", "feature", "click", "left", "right", "up", "down", "guess", "hint")
+MOVES = {LEFT: (0, -1), RIGHT: (0, 1), UP: (-1, 0), DOWN: (1, 0)}
+
+FLUSH_BYTES = 4096
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _put_str(out, text):
+    data = text.encode("utf-8")
+    out += struct.pack("<H", len(data))
+    out += data
+
+
+class Recorder:
+    """Appends events to path; written out every FLUSH_BYTES and on close()."""
+
+    def __init__(self, path, features=FEATURES, clock=time.monotonic):
+        self.features = list(features)
+        self.clock = clock
+        self._last = clock()
+        self._fh = open(path, "wb")
+        self._buf = bytearray(MAGIC)
+        self._buf += struct.pack("<HQB", VERSION, int(time.time() * 1000), len(self.features))
+        for f in self.features:
+            _put_str(self._buf, f)
+        self.flush()
+
+    def _event(self, op):
+        now = self.clock()
+        ms = max(0, round((now - self._last) * 1000))
+        # Keep the remainder so rounding doesn't drift over a long lesson
+        self._last += ms / 1000
+        self._buf.append(op)
+        _put_varint(self._buf, ms)
+        return self._buf
+
+    def _done(self):
+        if len(self._buf) >= FLUSH_BYTES:
+            self.flush()
+
+    def animal(self, key):
+        _put_str(self._event(ANIMAL), key)
+        self._done()
+
+    def feature(self, feature):
+        self._event(FEATURE).append(self.features.index(feature))
+        self._done()
+
+    def click(self, row, col):
+        buf = self._event(CLICK)
+        _put_varint(buf, row)
+        _put_varint(buf, col)
+        self._done()
+
+    def move(self, dr, dc):
+        self._event(next(op for op, d in MOVES.items() if d == (dr, dc)))
+        self._done()
+
+    def hint(self):
+        self._event(HINT)
+        self._done()
+
+    def guess(self, text):
+        _put_str(self._event(GUESS), text)
+        self._done()
+
+    def flush(self):
+        if self._buf:
+            self._fh.write(self._buf)
+            self._fh.flush()
+            self._buf.clear()
+
+    def close(self):
+        if not self._fh.closed:
+            self.flush()
+            self._fh.close()
+
+
+def read_recording(path):
+    """-> (header, [(seconds since start, op, args), ...]). A cut-off last event is dropped."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a recording")
+    try:
+        version, start_ms, n_features = struct.unpack_from("<HQB", data, 4)
+    except struct.error as e:
+        raise ValueError(f"{path} is truncated") from e
+    if version not in (1, VERSION):
+        raise ValueError(f"{path} is recording version {version}, expected {VERSION}")
+    pos = 15
+
+    def get_varint():
+        nonlocal pos
+        n = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            n |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return n
+
+    def get_str():
+        nonlocal pos
+        (n,) = struct.unpack_from("<H", data, pos)
+        if pos + 2 + n > len(data):
+            raise IndexError(pos)
+        text = data[pos + 2:pos + 2 + n].decode("utf-8")
+        pos += 2 + n
+        return text
+
+    features = [get_str() for _ in range(n_features)]
+    events = []
+    t = 0
+    while pos < len(data):
+        start = pos
+        try:
+            op = data[pos]
+            pos += 1
+            ms = get_varint()
+            if op in (ANIMAL, GUESS):
+                args = (get_str(),)
+            elif op == FEATURE:
+                args = (features[data[pos]],)
+                pos += 1
+            elif op == CLICK and version == 1:
+                args = (data[pos], data[pos + 1])
+                pos += 2
+            elif op == CLICK:
+                args = (get_varint(), get_varint())
+            elif op in MOVES or op == HINT:
+                args = ()
+            else:
+                raise ValueError(f"{path}: unknown event {op} at byte {start}")
+        except (IndexError, struct.error):
+            break   # the game was killed mid-write
+        t += ms
+        events.append((t / 1000, op, args))
+    return {"start": start_ms / 1000, "features": features}, events
+
+
+# -------------------------------------------------
+# Replay targets: the same calls a Recorder takes
+# -------------------------------------------------
+
+class EngineTarget:
+    """engine.GameEngine per animal, hints as the Tk game gives them."""
+
+    def __init__(self, registry=None):
+        from catalogindex import LiveIndex
+        from engine import GameEngine
+        from hints import CatalogHints
+
+        if registry is None:
+            from registry import registry_from_env
+            registry = registry_from_env(STATIC_DIR)
+        self.registry = registry
+        self.new_game = GameEngine
+        self.hints = CatalogHints(LiveIndex(registry))
+        self.games = {}
+        self.game = None
+
+    def animal(self, key):
+        self.game = self.games.get(key)
+        if self.game is None:
+            self.game = self.games[key] = self.new_game(self.registry.get(key))
+        self.game.select_feature(self.game.features[0])
+
+    def feature(self, feature):
+        self.game.select_feature(feature)
+
+    def click(self, row, col):
+        return self.game.click(row, col)
+
+    def move(self, dr, dc):
+        return self.game.move(dr, dc)
+
+    def hint(self):
+        cell = self.hints.hint(self.game.key, self.game.masks())[0]
+        if cell is not None:
+            self.game.place_cursor(*cell)
+        return cell
+
+    def guess(self, text):
+        return self.game.check_guess(text)
+
+    def close(self):
+        pass
+
+
+class WebTarget(EngineTarget):
+    """The browser's side of the web flow, against app.py through Flask's test client."""
+
+    # What a replay swaps out in app.py, put back by close()
+    SWAPPED = ("registry", "catalog_index", "catalog_hints", "play_stats", "game_states")
+
+    def __init__(self, registry=None):
+        import analytics
+        import app as app_module
+        import catalogindex
+        import gamestate
+        import hints
+
+        self.app = app_module
+        self._saved = {name: getattr(app_module, name) for name in self.SWAPPED}
+        if registry is not None:
+            # Hints and the index page are built on the registry too
+            app_module.registry = registry
+            app_module.catalog_index = catalogindex.LiveIndex(registry)
+            app_module.catalog_hints = hints.CatalogHints(app_module.catalog_index)
+            app_module._index_cache["version"] = None
+        # Replayed sessions are not real players: keep them out of the
+        # event log, /api/stats and the teacher's page
+        self.events_dir = tempfile.mkdtemp(prefix="ga-replay-")
+        app_module.play_stats = analytics.Analytics(
+            app_module.FM_SIZE, len(FEATURES) * app_module.FM_SIZE ** 2, directory=self.events_dir)
+        app_module.game_states = gamestate.GameStateStore()
+        super().__init__(app_module.registry)
+        self.client = app_module.app.test_client()
+        self.sid = os.urandom(16).hex()
+        self.client.get("/")
+
+    def animal(self, key):
+        super().animal(key)
+        self.client.get(f"/api/animals/{key}")
+
+    def _sync(self):
+        game = self.game
+        self.client.post(f"/api/state/{self.sid}",
+                         json={"r": [[game.key, game.selected_feature, game.row, game.col]]})
+
+    def click(self, row, col):
+        if super().click(row, col) is not None:
+            self._sync()
+
+    def move(self, dr, dc):
+        if super().move(dr, dc):
+            self._sync()
+
+    def hint(self):
+        import bitmaps
+
+        revealed = {f: bitmaps.map_to_b64(m, self.game.size) for f, m in self.game.masks().items() if m}
+        self.client.post(f"/api/hint/{self.game.key}", json={"revealed": revealed})
+        return super().hint()
+
+    def guess(self, text):
+        self.client.post(f"/api/state/{self.sid}", json={"g": [[self.game.key, text]]})
+        return super().guess(text)
+
+    def close(self):
+        # Empty the buffer first, or the log's thread would recreate the directory
+        try:
+            self.app.play_stats.log.flush()
+        except OSError:
+            pass
+        for name, value in self._saved.items():
+            setattr(self.app, name, value)
+        if self.registry is not self.app.registry:
+            self.app._index_cache["version"] = None    # rebuilt for the real catalog
+        shutil.rmtree(self.events_dir, ignore_errors=True)
+
+
+class TkTarget:
+    """convolutiongame.ConvolutionGame in a real (withdrawn) window."""
+
+    class Event:
+        def __init__(self, x, y):
+            self.x = x
+            self.y = y
+
+    def __init__(self, registry=None):
+        import tkinter as tk
+        import convolutiongame
+
+        try:
+            self.root = tk.Tk()
+        except tk.TclError as e:
+            raise RuntimeError(f"the Tk target needs a display ({e})") from e
+        self.root.withdraw()
+        self.game = convolutiongame.ConvolutionGame(self.root, registry)
+
+    def _update(self):
+        self.root.update_idletasks()
+
+    def animal(self, key):
+        self.game.select_animal(key)
+        self._update()
+
+    def feature(self, feature):
+        self.game.select_feature(feature)
+        self._update()
+
+    def click(self, row, col):
+        # Where the cell is on screen depends on the renderer's zoom, see gridview.py
+        self.game.handle_image_click(self.Event(*self.game.img_grid.point_of(row, col)))
+        self._update()
+
+    def move(self, dr, dc):
+        {(0, -1): self.game.move_left, (0, 1): self.game.move_right,
+         (-1, 0): self.game.move_up, (1, 0): self.game.move_down}[dr, dc](None)
+        self._update()
+
+    def hint(self):
+        self.game.show_hint()
+        self._update()
+
+    def guess(self, text):
+        self.game.guess_entry.delete(0, "end")
+        self.game.guess_entry.insert(0, text)
+        self.game.check_guess()
+        self._update()
+
+    def close(self):
+        self.root.destroy()
+
+
+TARGETS = {"engine": EngineTarget, "web": WebTarget, "tk": TkTarget}
+
+
+def replay(events, target, speed=0.0, clock=time.perf_counter, sleep=time.sleep):
+    """Feed events to target. speed 0 is as fast as possible, 1 is real time. -> seconds taken."""
+    start = clock()
+    for t, op, args in events:
+        if speed:
+            delay = start + t / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        if op in MOVES:
+            target.move(*MOVES[op])
+        else:
+            getattr(target, OP_NAMES[op])(*args)
+    return clock() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or replay a recorded game")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="print the events")
+    show.add_argument("path")
+    run = sub.add_parser("replay", help="re-run the events against the game")
+    run.add_argument("path")
+    run.add_argument("--target", choices=sorted(TARGETS), default="engine")
+    run.add_argument("--speed", type=float, default=0.0,
+                     help="1 = as recorded, 2 = twice as fast, 0 = as fast as possible (default)")
+    run.add_argument("--repeat", type=int, default=1)
+    run.add_argument("--animals", help="animals/ folder (default: the app's)")
+    run.add_argument("--pack", help="content pack to load instead, see contentpack.py")
+    args = parser.parse_args(argv)
+
+    header, events = read_recording(args.path)
+    if args.command == "show":
+        print(f"recorded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['start']))}, "
+              f"{len(events)} events, {events[-1][0] if events else 0:.1f} s")
+        for t, op, values in events:
+            print(f"{t:9.3f}  {OP_NAMES[op]:8} {' '.join(map(str, values))}")
+        return
+
+    from registry import ANIMALS_DIR, AnimalRegistry
+
+    registry = (AnimalRegistry(args.animals or ANIMALS_DIR, static_dir=STATIC_DIR, pack=args.pack)
+                if args.animals or args.pack else None)
+    times = []
+    for _ in range(args.repeat):
+        # A fresh game each time, so every run starts from the same state
+        try:
+            target = TARGETS[args.target](registry)
+        except RuntimeError as e:
+            parser.error(str(e))
+        try:
+            times.append(replay(events, target, args.speed))
+        finally:
+            target.close()
+    best = min(times)
+    print(f"{len(events)} events x {args.repeat}: best {best * 1000:.2f} ms, "
+          f"{len(events) / best if best else float('inf'):.0f} events/s ({args.target})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""Animals discovered from the animals/ data directory.
+
+Each animal is a folder:
+
+    animals/<key>/meta.json   {"name": "giraffe", "display": "Animal 1", "image": "images/giraffe.png"}
+    animals/<key>/maps.json   {"eye": [[0,1,...], ...], ...}   (optional)
+
+`image` is relative to static/. Without maps.json the maps are derived from
+the image by convengine. Only the folder names are read up front; an entry's
+files are read the first time it is asked for. Every `check_interval`
+seconds the folder list and the files of loaded entries (meta.json,
+maps.json and the image) are re-stat'ed, and anything that changed is picked
+up without a restart. A folder that fails to load is logged once and not
+tried again until one of its files changes. `version` goes up
+whenever that happens, so callers can drop whatever they built from the
+previous data.
+
+With `pack` set, the animals come from a content pack built by contentpack.py
+instead: the whole file is read at once and re-read when it is replaced.
+
+The web app, the room server and the desktop game all build theirs with
+registry_from_env(), so the same settings apply to each of them:
+
+    GUESSANIMAL_PACK=animals.pack     load this content pack instead of animals/
+    GUESSANIMAL_DERIVED_MAPS=1        ignore maps.json, derive the maps from the images
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import bitmaps
+import contentpack
+import convengine
+from assets import STATIC_DIR
+from convcore import FM_SIZE
+
+log = logging.getLogger(__name__)
+
+ANIMALS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "animals")
+
+
+def natural_key(key):
+    # "animal2" sorts before "animal10"
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", key)]
+
+
+class Animal:
+    __slots__ = ("key", "name", "display", "image", "maps", "signature", "variants")
+
+    def __init__(self, key, name, display, image, maps, signature, variants=None):
+        self.key = key
+        self.name = name
+        self.display = display
+        self.image = image
+        self.maps = maps            # {feature: packed int}, see bitmaps.py
+        self.signature = signature
+        self.variants = variants    # {"webp": .., "png": ..} already built, relative to static/
+
+
+class AnimalRegistry:
+    def __init__(self, root=ANIMALS_DIR, static_dir=None, derive_maps=False,
+                 check_interval=2.0, clock=time.monotonic, pack=None):
+        self.root = root
+        self.pack = pack
+        self.static_dir = static_dir
+        self.derive_maps = derive_maps
+        self.check_interval = check_interval
+        self.clock = clock
+        self.version = 0
+        self._keys = []
+        self._key_set = frozenset()
+        self._root_mtime = None
+        self._entries = {}
+        self._failed = {}           # key -> signature it failed to load with
+        self._last_check = None
+        self._lock = threading.Lock()
+        self._scan()
+
+    # -------------------------------------------------
+
+    def _scan(self):
+        if self.pack is not None:
+            return self._scan_pack()
+        try:
+            mtime = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._root_mtime:
+            return False
+        keys = []
+        if mtime is not None:
+            with os.scandir(self.root) as it:
+                keys = [e.name for e in it if e.is_dir() and not e.name.startswith(".")]
+        keys.sort(key=natural_key)
+        self._root_mtime = mtime
+        self._keys = keys
+        self._key_set = frozenset(keys)
+        for key in list(self._entries):
+            if key not in self._key_set:
+                del self._entries[key]
+        for key in list(self._failed):
+            if key not in self._key_set:
+                del self._failed[key]
+        return True
+
+    def _scan_pack(self):
+        try:
+            mtime = os.stat(self.pack).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._root_mtime:
+            return False
+        entries = {}
+        if mtime is not None:
+            try:
+                _, size, records = contentpack.read_pack(self.pack)
+                if size != FM_SIZE:
+                    raise ValueError(f"{self.pack} has {size}x{size} maps, expected {FM_SIZE}")
+            except (OSError, ValueError):
+                # Keep what we had; a fixed pack has a new mtime and is tried again
+                log.exception("could not load content pack %r", self.pack)
+                self._root_mtime = mtime
+                return False
+            for rec in records:
+                entries[rec["key"]] = Animal(
+                    rec["key"], rec["name"], rec["display"], rec["png"], rec["maps"],
+                    (mtime,), {"webp": rec["webp"], "png": rec["png"]})
+        self._root_mtime = mtime
+        self._keys = sorted(entries, key=natural_key)
+        self._key_set = frozenset(self._keys)
+        self._entries = entries
+        return True
+
+    def _signature(self, key, image_path=None):
+        """(mtime, size) of meta.json, maps.json and the image (None if missing)."""
+        if self.pack is not None:
+            return (self._root_mtime,)
+        sig = []
+        for path in (os.path.join(self.root, key, "meta.json"),
+                     os.path.join(self.root, key, "maps.json"), image_path):
+            try:
+                st = os.stat(path) if path is not None else None
+            except (FileNotFoundError, NotADirectoryError):
+                st = None
+            sig.append((st.st_mtime_ns, st.st_size) if st is not None else None)
+        return tuple(sig)
+
+    def _image_path(self, key, entry=None):
+        # Where the entry's (or else meta.json's) image is, None if that can't be told
+        if self.static_dir is None or self.pack is not None:
+            return None
+        if entry is not None:
+            return os.path.join(self.static_dir, entry.image)
+        try:
+            with open(os.path.join(self.root, key, "meta.json")) as fh:
+                return os.path.join(self.static_dir, json.load(fh)["image"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _load(self, key, signature):
+        folder = os.path.join(self.root, key)
+        with open(os.path.join(folder, "meta.json")) as fh:
+            meta = json.load(fh)
+        if not isinstance(meta, dict) or not isinstance(meta.get("image"), str):
+            raise ValueError(f"{folder}/meta.json is not an object with an image")
+        image = meta["image"]
+
+        maps = None
+        if not self.derive_maps and signature[1] is not None:
+            with open(os.path.join(folder, "maps.json")) as fh:
+                maps = json.load(fh)
+            if not isinstance(maps, dict):
+                raise ValueError(f"{folder}/maps.json is not an object")
+        if maps is None:
+            maps = convengine.feature_maps_for_image(os.path.join(self.static_dir, image))
+
+        return Animal(key, meta["name"], meta.get("display", key), image,
+                      bitmaps.pack_maps(maps), signature)
+
+    # -------------------------------------------------
+
+    def refresh(self, force=False):
+        """Re-check the data directory if check_interval has passed. True if anything changed."""
+        now = self.clock()
+        if not force and self._last_check is not None and now - self._last_check < self.check_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            changed = self._scan()
+            for key, entry in list(self._entries.items()):
+                if self._signature(key, self._image_path(key, entry)) != entry.signature:
+                    del self._entries[key]
+                    changed = True
+            if changed:
+                self.version += 1
+            return changed
+
+    def keys(self):
+        self.refresh()
+        return self._keys
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, key):
+        """The Animal for key (loaded on first use), or None if there is no such folder."""
+        self.refresh()
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        if key not in self._key_set:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                signature = self._signature(key, self._image_path(key))
+                if self._failed.get(key) == signature:
+                    return None     # still broken, already logged
+                try:
+                    entry = self._load(key, signature)
+                except (OSError, ValueError, KeyError):
+                    # Half-written or broken folder; tried again once its files change
+                    log.exception("could not load animal %r", key)
+                    self._failed[key] = signature
+                    return None
+                self._failed.pop(key, None)
+                self._entries[key] = entry
+            return entry
+
+
+def registry_from_env(static_dir=STATIC_DIR, environ=os.environ, **options):
+    """An AnimalRegistry set up from GUESSANIMAL_PACK and GUESSANIMAL_DERIVED_MAPS."""
+    return AnimalRegistry(
+        static_dir=static_dir,
+        derive_maps=environ.get("GUESSANIMAL_DERIVED_MAPS") == "1",
+        pack=environ.get("GUESSANIMAL_PACK") or None,
+        **options,
+    )
@@ -0,0 +1,274 @@
+"""Live classroom rooms over WebSockets.
+
+    python rooms.py                       # ws://0.0.0.0:8765
+    python rooms.py --port 9000 --tick 0.5
+
+A teacher opens a room for one animal at /teacher (served by app.py), which
+connects here to /teach?animal=<key> and gets a room code. Students open the
+game with ?room=<code>; app.js connects to /play/<code>, switches to the room's
+animal and sends up the same batched reveals and guesses it syncs to app.py.
+
+Nothing is sent per event. Each room collects what changed, and every `tick`
+seconds one ticker sends:
+- each teacher a diff: the changed reveal counts plus the students who
+  joined, changed or left;
+- the students a two-number summary, and only when it changed.
+A busy room of 300 students costs the teacher roughly one message of a few
+hundred bytes per tick, so one process can host many rooms.
+
+    teacher <- {"type": "snapshot", "code", "animal", "size", "features",
+                "heat": {feature: [[count, ...], ...]}, "students": {id: [name, revealed, solved]}}
+    teacher <- {"type": "diff", "cells": [[feature index, r * size + c, count], ...],
+                "students": {id: [name, revealed, solved]}, "left": [id, ...]}
+    student <- {"type": "welcome", "animal": key}
+    student <- {"type": "room", "students": n, "solved": n}
+    student -> {"r": [[feature, r, c], ...], "g": [guess, ...]}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import secrets
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from websockets.asyncio.server import broadcast, serve
+from websockets.exceptions import ConnectionClosed
+
+from convcore import FM_SIZE
+from engine import normalize_guess
+from registry import registry_from_env
+
+log = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+MAX_ROOMS = 100
+MAX_STUDENTS = 500
+MAX_MESSAGE = 16 * 1024
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"   # no 0/O or 1/I
+
+
+class Student:
+    __slots__ = ("name", "masks", "revealed", "solved")
+
+    def __init__(self, name, features):
+        self.name = name
+        self.masks = [0] * features
+        self.revealed = 0
+        self.solved = False
+
+
+class Room:
+    def __init__(self, code, animal, size=FM_SIZE):
+        self.code = code
+        self.animal = animal.key
+        self.answer = normalize_guess(animal.name)
+        self.size = size
+        self.features = list(animal.maps)
+        self.feature_index = {f: i for i, f in enumerate(self.features)}
+        # How many students revealed each cell
+        self.heat = np.zeros((len(self.features), size * size), np.int32)
+        self.students = {}
+        self.solved = 0
+        self.next_id = 1
+        self.teachers = set()
+        self.players = set()
+        # Changes since the last tick
+        self._dirty_cells = set()
+        self._dirty_students = set()
+        self._left = []
+        self._summary = None
+
+    def __len__(self):
+        return len(self.teachers) + len(self.players)
+
+    def join(self, name):
+        sid = str(self.next_id)
+        self.next_id += 1
+        self.students[sid] = Student(name, len(self.features))
+        self._dirty_students.add(sid)
+        return sid
+
+    def leave(self, sid):
+        # Their reveals stay in the heatmap
+        if self.students.pop(sid).solved:
+            self.solved -= 1
+        self._dirty_students.discard(sid)
+        self._left.append(sid)
+
+    def apply(self, sid, message):
+        """A student's {"r": [[feature, r, c], ...], "g": [text, ...]}; bad items are ignored."""
+        student = self.students[sid]
+        size = self.size
+        reveals = message.get("r")
+        guesses = message.get("g")
+        if not isinstance(reveals, list):
+            reveals = ()
+        if not isinstance(guesses, list):
+            guesses = ()
+        for item in reveals[:size * size * len(self.features)]:
+            try:
+                feature, r, c = item
+                fi = self.feature_index[feature]
+            except (TypeError, ValueError, KeyError):
+                continue
+            if type(r) is not int or type(c) is not int or not (0 <= r < size and 0 <= c < size):
+                continue
+            cell = r * size + c
+            bit = 1 << cell
+            if student.masks[fi] & bit:
+                continue
+            student.masks[fi] |= bit
+            student.revealed += 1
+            self.heat[fi, cell] += 1
+            self._dirty_cells.add((fi, cell))
+            self._dirty_students.add(sid)
+        for text in guesses[:16]:
+            if (not student.solved and isinstance(text, str)
+                    and normalize_guess(text) == self.answer):
+                student.solved = True
+                self.solved += 1
+                self._dirty_students.add(sid)
+
+    def snapshot(self):
+        return {
+            "type": "snapshot", "code": self.code, "animal": self.animal,
+            "size": self.size, "features": self.features,
+            "heat": {f: self.heat[i].reshape(self.size, self.size).tolist()
+                     for i, f in enumerate(self.features)},
+            "students": {sid: [s.name, s.revealed, s.solved] for sid, s in self.students.items()},
+        }
+
+    def take_diff(self):
+        """The teachers' diff since the last call, or None if nothing changed."""
+        if not (self._dirty_cells or self._dirty_students or self._left):
+            return None
+        diff = {
+            "type": "diff",
+            "cells": [[fi, cell, int(self.heat[fi, cell])] for fi, cell in sorted(self._dirty_cells)],
+            "students": {sid: [self.students[sid].name, self.students[sid].revealed,
+                               self.students[sid].solved]
+                         for sid in self._dirty_students},
+            "left": self._left,
+        }
+        self._dirty_cells = set()
+        self._dirty_students = set()
+        self._left = []
+        return diff
+
+    def take_summary(self):
+        """The students' summary if it changed since the last call."""
+        summary = (len(self.students), self.solved)
+        if summary == self._summary:
+            return None
+        self._summary = summary
+        return {"type": "room", "students": summary[0], "solved": summary[1]}
+
+
+class RoomServer:
+    def __init__(self, registry, tick=1.0):
+        self.registry = registry
+        self.tick = tick
+        self.rooms = {}
+
+    def new_code(self):
+        while True:
+            code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(5))
+            if code not in self.rooms:
+                return code
+
+    def _close_if_empty(self, room):
+        if not len(room) and self.rooms.get(room.code) is room:
+            del self.rooms[room.code]
+
+    async def ticker(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            for room in list(self.rooms.values()):
+                diff = room.take_diff()
+                if diff is not None and room.teachers:
+                    broadcast(room.teachers, json.dumps(diff, separators=(",", ":")))
+                summary = room.take_summary()
+                if summary is not None and room.players:
+                    broadcast(room.players, json.dumps(summary, separators=(",", ":")))
+
+    async def handler(self, ws):
+        url = urlsplit(ws.request.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if parts == ["teach"]:
+            await self.teach(ws, query.get("animal", [""])[0])
+        elif len(parts) == 2 and parts[0] == "watch":
+            await self.watch(ws, self.rooms.get(parts[1].upper()))
+        elif len(parts) == 2 and parts[0] == "play":
+            await self.play(ws, self.rooms.get(parts[1].upper()), query.get("name", [""])[0][:32])
+        else:
+            await ws.close(1008, "unknown path")
+
+    async def teach(self, ws, key):
+        animal = self.registry.get(key)
+        if animal is None:
+            await ws.close(1008, "unknown animal")
+            return
+        if len(self.rooms) >= MAX_ROOMS:
+            await ws.close(1013, "too many rooms")
+            return
+        code = self.new_code()
+        room = self.rooms[code] = Room(code, animal)
+        await self.watch(ws, room)
+
+    async def watch(self, ws, room):
+        if room is None:
+            await ws.close(1008, "no such room")
+            return
+        room.teachers.add(ws)
+        try:
+            await ws.send(json.dumps(room.snapshot(), separators=(",", ":")))
+            await ws.wait_closed()
+        finally:
+            room.teachers.discard(ws)
+            self._close_if_empty(room)
+
+    async def play(self, ws, room, name):
+        if room is None:
+            await ws.close(1008, "no such room")
+            return
+        if len(room.students) >= MAX_STUDENTS:
+            await ws.close(1013, "room is full")
+            return
+        sid = room.join(name)
+        room.players.add(ws)
+        try:
+            await ws.send(json.dumps({"type": "welcome", "animal": room.animal}))
+            async for raw in ws:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    room.apply(sid, message)
+        except ConnectionClosed:
+            pass
+        finally:
+            room.players.discard(ws)
+            room.leave(sid)
+            self._close_if_empty(room)
+
+
+async def main(host, port, tick):
+    server = RoomServer(registry_from_env(STATIC_DIR), tick)
+    async with serve(server.handler, host, port, max_size=MAX_MESSAGE):
+        log.info("rooms listening on ws://%s:%d", host, port)
+        await server.ticker()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live classroom room server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between broadcasts")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.host, args.port, args.tick))
@@ -0,0 +1,88 @@
+"""Saved games for the desktop game, one SQLite file for the whole PC.
+
+    python convolutiongame.py --profile maya    # resumes where maya left off
+    python convolutiongame.py --profiles        # who has saved games
+
+Each profile (a student's name on a shared classroom PC) has one row per
+animal played: the revealed cells at 2 bits per cell (engine.pack_cells, 150
+bytes for six 10x10 maps), where the cursor was left on each feature map,
+and the guess. The game doesn't write on every key press: it marks the
+animal dirty and saves all dirty animals in one transaction once the
+student has paused for a moment, and again when the window closes.
+
+The file is GUESSANIMAL_SAVES or saves.sqlite3 next to this file.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+SAVES_PATH = os.environ.get(
+    "GUESSANIMAL_SAVES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "saves.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    name TEXT PRIMARY KEY,
+    animal TEXT,                -- the animal they were on
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    profile TEXT NOT NULL,
+    animal TEXT NOT NULL,
+    cells BLOB NOT NULL,        -- see engine.pack_cells
+    positions BLOB NOT NULL,    -- u16 row, col per feature, see engine.save_state
+    correct INTEGER NOT NULL,
+    guess TEXT NOT NULL,
+    PRIMARY KEY (profile, animal)
+) WITHOUT ROWID;
+"""
+
+
+class SaveStore:
+    def __init__(self, path=SAVES_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            # WAL: a save doesn't block another copy of the game reading
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+
+    def profiles(self):
+        """Profile names, most recently played first."""
+        with self._lock:
+            return [name for (name,) in self._db.execute(
+                "SELECT name FROM profiles ORDER BY updated DESC")]
+
+    def load(self, profile):
+        """-> (last animal or None, {animal: (cells, positions, correct, guess)})."""
+        with self._lock:
+            row = self._db.execute("SELECT animal FROM profiles WHERE name = ?", (profile,)).fetchone()
+            games = {animal: (cells, positions, correct, guess)
+                     for animal, cells, positions, correct, guess in self._db.execute(
+                         "SELECT animal, cells, positions, correct, guess FROM games WHERE profile = ?",
+                         (profile,))}
+        return (row[0] if row else None), games
+
+    def save(self, profile, animal, games):
+        """Write games {animal: engine.GameEngine} and the current animal in one transaction."""
+        rows = [(profile, key, *game.save_state()) for key, game in games.items()]
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO profiles (name, animal, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET animal = excluded.animal, updated = excluded.updated",
+                (profile, animal, self.clock()))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO games (profile, animal, cells, positions, correct, guess) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def delete(self, profile):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM games WHERE profile = ?", (profile,))
+            self._db.execute("DELETE FROM profiles WHERE name = ?", (profile,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,19 +1,62 @@
 // app.js
 // Handles canvas grids, feature maps, highlighting, clicks, and guess logic.
 
-// constants (match your Python version)
-const IMG_SIZE = 30;
-const FILTER_SIZE = 3;
-const STRIDE = 3;
-const FM_SIZE = IMG_SIZE / STRIDE; // 10
+// constants come from convcore.py via the page (see index.html)
+const IMG_SIZE = CONV.imgSize;
+const FILTER_SIZE = CONV.filterSize;
+const STRIDE = CONV.stride;
+const PADDING = CONV.padding;
+const FM_SIZE = CONV.fmSize;
 const CELL_SIZE = 20;              // visual size in CSS; canvas uses pixels (we'll scale)
 const SCALE = 17;           // one logical cell equals CELL_SIZE px
 
 
+// Maps may arrive packed (base64 bitmaps, see bitmaps.py): cell (r, c) is
+// bit r*size + c, little-endian. Unpack them into the nested 0/1 arrays the
+// rest of this file works with.
+function decodePackedMap(b64, size) {
+  const raw = atob(b64);
+  const grid = [];
+  for (let r = 0; r < size; r++) {
+    const row = [];
+    for (let c = 0; c < size; c++) {
+      const i = r * size + c;
+      row.push((raw.charCodeAt(i >> 3) >> (i & 7)) & 1);
+    }
+    grid.push(row);
+  }
+  return grid;
+}
+
+// The reverse, for sending which cells are revealed (non-null) to the server
+function encodePackedMap(grid) {
+  const size = grid.length;
+  const bytes = new Uint8Array(Math.ceil(size * size / 8));
+  for (let r = 0; r < size; r++) {
+    for (let c = 0; c < size; c++) {
+      const i = r * size + c;
+      if (grid[r][c] !== null) bytes[i >> 3] |= 1 << (i & 7);
+    }
+  }
+  return btoa(String.fromCharCode(...bytes));
+}
+
+function unpackAnimal(animal) {
+  if (animal.filters || !animal.packed) return;
+  animal.filters = {};
+  for (const [feature, b64] of Object.entries(animal.packed.maps)) {
+    animal.filters[feature] = decodePackedMap(b64, animal.packed.size);
+  }
+}
+
+Object.values(ANIMALS).forEach(unpackAnimal);
+
+
 // Client-side data structures
-let CURRENT_ANIMAL = "animal1";
+let CURRENT_ANIMAL = Object.keys(ANIMALS)[0];
 let CORRECT_WORD = ANIMALS[CURRENT_ANIMAL].name;
 let GIRAFFE_URL = ANIMALS[CURRENT_ANIMAL].image;
+let GIRAFFE_FALLBACK_URL = ANIMALS[CURRENT_ANIMAL].imageFallback;
 let HARDCODED_MAPS = ANIMALS[CURRENT_ANIMAL].filters;
 let FEATURES = Object.keys(HARDCODED_MAPS);
 let userMaps = {};
@@ -24,15 +67,167 @@ let imageRevealed = false;
 let giraffeImage = null;
 let imgCanvas, imgCtx;
 
-let FEATURE_MAP_STATE = {
-    animal1: {}, 
-    animal2: {}
-};
+let FEATURE_MAP_STATE = {};
+let ANIMAL_GUESS_STATE = {};
+let SERVER_PROGRESS = {};  // saved progress for animals not fetched yet
+
+function initAnimalState(key) {
+  FEATURE_MAP_STATE[key] = {};
+  ANIMAL_GUESS_STATE[key] = { correct: false, revealed: false, guessText: "" };
+}
 
-let ANIMAL_GUESS_STATE = {
-  animal1: { correct: false, revealed: false, guessText: "" },
-  animal2: { correct: false, revealed: false, guessText: "" }
-};
+Object.keys(ANIMALS).forEach(initAnimalState);
+
+// --- animal catalog ---
+// The page only carries the first animal; the list of animals comes from
+// /api/animals (paginated) and each animal's details from /api/animals/<key>
+// the first time it is picked.
+async function ensureAnimal(key) {
+  if (ANIMALS[key]) return ANIMALS[key];
+  const resp = await fetch("/api/animals/" + encodeURIComponent(key));
+  if (!resp.ok) throw new Error("could not load animal " + key);
+  const animal = await resp.json();
+  unpackAnimal(animal);
+  ANIMALS[key] = animal;
+  initAnimalState(key);
+  applyServerProgress(key);
+  return animal;
+}
+
+async function loadAnimalIndex(onPage) {
+  let url = "/api/animals";
+  while (url) {
+    const resp = await fetch(url);
+    if (!resp.ok) return;
+    const page = await resp.json();
+    onPage(page.animals);
+    url = page.next;
+  }
+}
+
+// --- server sync ---
+// Progress is mirrored to the server (/api/state/<id>) as small batched
+// deltas so a reload can pick up where the student left off.
+const SESSION_ID = (() => {
+  let id = localStorage.getItem("guessAnimalSession");
+  if (!id) {
+    id = (crypto.randomUUID ? crypto.randomUUID() : String(Math.random()).slice(2) + Date.now())
+      .replace(/[^A-Za-z0-9_-]/g, "");
+    localStorage.setItem("guessAnimalSession", id);
+  }
+  return id;
+})();
+const STATE_URL = "/api/state/" + SESSION_ID;
+const SYNC_DELAY_MS = 300;
+
+let pendingReveals = [];
+let pendingGuesses = [];
+let syncTimer = null;
+
+function queueReveal(animal, feature, r, c) {
+  pendingReveals.push([animal, feature, r, c]);
+  scheduleSync();
+}
+
+function queueGuess(animal, text) {
+  pendingGuesses.push([animal, text]);
+  scheduleSync();
+}
+
+function scheduleSync() {
+  if (syncTimer === null) syncTimer = setTimeout(flushSync, SYNC_DELAY_MS);
+}
+
+function flushSync() {
+  syncTimer = null;
+  if (!pendingReveals.length && !pendingGuesses.length) return;
+  sendLive(pendingReveals, pendingGuesses);
+  if (pendingReveals.length) updateNarrowing();
+  const body = JSON.stringify({ r: pendingReveals, g: pendingGuesses });
+  pendingReveals = [];
+  pendingGuesses = [];
+  fetch(STATE_URL, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: body,
+    keepalive: true
+  }).catch(() => {});  // progress sync is best effort
+}
+
+// --- live classroom (rooms.py) ---
+// Opened with ?room=CODE the page joins the teacher's room, switches to its
+// animal and sends the same batches as flushSync() up the socket.
+const ROOM_CODE = new URLSearchParams(location.search).get("room");
+let liveSocket = null;
+let liveAnimal = null;
+
+function liveBaseUrl() {
+  if (LIVE_URL) return LIVE_URL;
+  return (location.protocol === "https:" ? "wss://" : "ws://") + location.hostname + ":8765";
+}
+
+function joinRoom() {
+  if (!ROOM_CODE) return;
+  const status = document.getElementById("room-status");
+  liveSocket = new WebSocket(liveBaseUrl() + "/play/" + encodeURIComponent(ROOM_CODE));
+  liveSocket.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "welcome") {
+      liveAnimal = msg.animal;
+      const btn = document.querySelector(`.animal-btn[data-key="${liveAnimal}"]`);
+      switchAnimal(liveAnimal, btn);
+    } else if (msg.type === "room") {
+      status.textContent = `Room ${ROOM_CODE}: ${msg.solved} of ${msg.students} students solved it`;
+    }
+  };
+  liveSocket.onclose = () => {
+    status.textContent = `Room ${ROOM_CODE}: disconnected`;
+  };
+}
+
+function sendLive(reveals, guesses) {
+  if (!liveSocket || liveSocket.readyState !== WebSocket.OPEN) return;
+  const r = reveals.filter(item => item[0] === liveAnimal).map(item => item.slice(1));
+  const g = guesses.filter(item => item[0] === liveAnimal).map(item => item[1]);
+  if (r.length || g.length) liveSocket.send(JSON.stringify({ r, g }));
+}
+
+async function loadServerState() {
+  let saved;
+  try {
+    const resp = await fetch(STATE_URL);
+    if (!resp.ok) return;
+    saved = await resp.json();
+  } catch (e) {
+    return;
+  }
+
+  SERVER_PROGRESS = saved;
+  Object.keys(ANIMALS).forEach(applyServerProgress);
+  // switchAnimal() saves userMaps first, so bring them in line with the server
+  restoreFeatureMaps(CURRENT_ANIMAL);
+}
+
+function applyServerProgress(animalKey) {
+  const progress = SERVER_PROGRESS[animalKey];
+  const animal = ANIMALS[animalKey];
+  if (!progress || !animal) return;
+  delete SERVER_PROGRESS[animalKey];
+
+  const state = {};
+  for (const [feature, truthMap] of Object.entries(animal.filters)) {
+    const b64 = progress.revealed[feature];
+    const mask = b64 ? decodePackedMap(b64, FM_SIZE) : null;
+    state[feature] = truthMap.map((row, r) =>
+      row.map((truth, c) => (mask && mask[r][c]) ? (truth ? 'red' : 'blue') : null));
+  }
+  FEATURE_MAP_STATE[animalKey] = state;
+  ANIMAL_GUESS_STATE[animalKey] = {
+    correct: progress.correct,
+    revealed: progress.correct,
+    guessText: progress.guess
+  };
+}
 
 // Initialize userMaps and savedPositions
 for (const f of FEATURES) {
@@ -77,12 +272,21 @@ function restoreFeatureMaps(animalKey) {
 }
 
 
-function switchAnimal(newAnimalKey, button) {
+async function switchAnimal(newAnimalKey, button) {
+  try {
+    await ensureAnimal(newAnimalKey);
+  } catch (e) {
+    const feedback = document.getElementById("guessFeedback");
+    feedback.textContent = "(unable to load that animal)";
+    feedback.style.color = "orange";
+    return;
+  }
   saveCurrentFeatureMaps();
 
   CURRENT_ANIMAL = newAnimalKey;
   CORRECT_WORD = ANIMALS[newAnimalKey].name;
   GIRAFFE_URL = ANIMALS[newAnimalKey].image;
+  GIRAFFE_FALLBACK_URL = ANIMALS[newAnimalKey].imageFallback;
   HARDCODED_MAPS = ANIMALS[newAnimalKey].filters;
   FEATURES = Object.keys(HARDCODED_MAPS);
 
@@ -104,7 +308,9 @@ function switchAnimal(newAnimalKey, button) {
     imageRevealed = true;
     giraffeImage = new Image();
     giraffeImage.onload = () => drawImagePatch();
+    useFallbackOnError(giraffeImage);
     giraffeImage.src = GIRAFFE_URL;
+    showPipeline(newAnimalKey);
 
     } else {
     // not solved -> clear
@@ -112,10 +318,13 @@ function switchAnimal(newAnimalKey, button) {
     input.value = "";  
     imageRevealed = false;
     drawImagePatch();
+    document.getElementById("pipeline").innerHTML = "";
     }
 
 
 
+  document.getElementById('narrowing').textContent = "";
+
   // 2️⃣ Build UI
   document.getElementById("feature-maps").innerHTML = "";
   selectedFeature = FEATURES[0];
@@ -140,6 +349,18 @@ function switchAnimal(newAnimalKey, button) {
 
 
 // --- UI build ---
+function addAnimalButtons(animals) {
+  const container = document.getElementById('animal-select');
+  for (const animal of animals) {
+    const btn = document.createElement('button');
+    btn.className = 'animal-btn' + (animal.key === CURRENT_ANIMAL ? ' active' : '');
+    btn.dataset.key = animal.key;
+    btn.textContent = animal.display;
+    btn.addEventListener("click", () => switchAnimal(animal.key, btn));
+    container.appendChild(btn);
+  }
+}
+
 function makeFilterButtons() {
   const container = document.getElementById('filter-buttons');
   container.innerHTML = '';
@@ -197,6 +418,66 @@ function drawMainGrid() {
   }
 }
 
+// --- server-rendered maps (maprender.py) ---
+// Opened with ?render=server the feature maps are drawn from PNGs the server
+// renders for each state (GET /api/render/...), one drawImage instead of a
+// stroke and fill per cell. The URLs never change meaning, so the browser
+// caches them and a state seen before costs nothing.
+const SERVER_RENDER = new URLSearchParams(location.search).get("render") === "server";
+const mapPngs = new Map();   // url -> Image
+const shownPngs = {};        // feature -> { animal, img, grid }: the last PNG drawn
+
+function mapPngUrl(feature) {
+  const mask = encodePackedMap(userMaps[feature])
+    .replace(/\+/g, "-").replace(/\//g, "_").replace(/=+$/, "");
+  return `/api/render/${encodeURIComponent(CURRENT_ANIMAL)}/${feature}/${mask}.png` +
+    `?v=${ANIMALS[CURRENT_ANIMAL].rev}&s=${SCALE}`;
+}
+
+// Draws the map from its PNG. A state not loaded yet (every new click) is
+// drawn as the last PNG plus the cells revealed since, and redrawn from its
+// own PNG when that arrives. Returns false if there is nothing to start from,
+// so the caller paints the whole map by hand.
+function drawMapPng(ctx, feature) {
+  const url = mapPngUrl(feature);
+  let img = mapPngs.get(url);
+  if (!img) {
+    if (mapPngs.size > 256) mapPngs.clear();
+    img = new Image();
+    img.onload = () => {
+      // Only this map, and only if it still shows that state
+      if (mapPngUrl(feature) !== url) return;
+      drawFeatureMap(feature);
+      if (feature === selectedFeature) drawFmCursor();
+    };
+    img.src = url;
+    mapPngs.set(url, img);
+  }
+  if (img.complete && img.naturalWidth) {
+    ctx.drawImage(img, 0, 0);
+    shownPngs[feature] = { animal: CURRENT_ANIMAL, img, grid: userMaps[feature].map(row => row.slice()) };
+    return true;
+  }
+
+  const shown = shownPngs[feature];
+  if (!shown || shown.animal !== CURRENT_ANIMAL) return false;
+  const changed = [];
+  for (let r=0;r<FM_SIZE;r++){
+    for (let c=0;c<FM_SIZE;c++){
+      const color = userMaps[feature][r][c];
+      if (color === shown.grid[r][c]) continue;
+      if (!color) return false;   // cells never hide again, but a restore may differ
+      changed.push([r, c, color]);
+    }
+  }
+  ctx.drawImage(shown.img, 0, 0);
+  for (const [r, c, color] of changed) {
+    ctx.fillStyle = color;
+    ctx.fillRect(c*SCALE+1, r*SCALE+1, SCALE-1, SCALE-1);
+  }
+  return true;
+}
+
 function drawAllFeatureMaps() {
   for (const f of FEATURES) drawFeatureMap(f);
 }
@@ -208,6 +489,7 @@ function drawFeatureMap(feature) {
   canvases.forEach(c => { if (c.dataset.feature === feature) canvas = c; });
   if (!canvas) return;
   const ctx = canvas.getContext('2d');
+  if (SERVER_RENDER && ANIMALS[CURRENT_ANIMAL].rev && drawMapPng(ctx, feature)) return;
 
   // clear
   ctx.fillStyle = '#fff';
@@ -244,6 +526,12 @@ function updateHighlights() {
     drawFeatureMap(f);
   }
 
+  drawFmCursor();
+  // Draw the patch highlight on the main image as well
+  drawImagePatch();
+}
+
+function drawFmCursor() {
   // Draw highlight on selected feature if there is cursorRow/Col for it
   const [sr, sc] = savedPositions[selectedFeature];
   if (sr !== null && sc !== null) {
@@ -257,8 +545,6 @@ function updateHighlights() {
     ctx.lineWidth = 1;
     ctx.strokeRect(sc*SCALE+2, sr*SCALE+2, SCALE-4, SCALE-4);
   }
-  // Draw the patch highlight on the main image as well
-  drawImagePatch();
 }
 
 function drawImagePatch() {
@@ -285,8 +571,8 @@ function drawImagePatch() {
   // draw the patch if we have cursor position for selectedFeature
   const [sr, sc] = savedPositions[selectedFeature];
   if (sr !== null && sc !== null) {
-    const top = sr * STRIDE * SCALE;
-    const left = sc * STRIDE * SCALE;
+    const top = (sr * STRIDE - PADDING) * SCALE;
+    const left = (sc * STRIDE - PADDING) * SCALE;
     imgCtx.save();  
     imgCtx.lineWidth = 3;
     imgCtx.strokeStyle = 'yellow';
@@ -320,10 +606,70 @@ function selectFeature(feature) {
   updateHighlights();
 }
 
+// "You've narrowed it to N animals": the catalog animals matching every cell
+// revealed so far (see catalogindex.py)
+async function updateNarrowing() {
+  const red = {}, blue = {};
+  for (const f of FEATURES) {
+    red[f] = encodePackedMap(userMaps[f].map(row => row.map(v => v === 'red' ? 1 : null)));
+    blue[f] = encodePackedMap(userMaps[f].map(row => row.map(v => v === 'blue' ? 1 : null)));
+  }
+  const animal = CURRENT_ANIMAL;
+  let result;
+  try {
+    const resp = await fetch("/api/consistent", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ red, blue })
+    });
+    if (!resp.ok) return;
+    result = await resp.json();
+  } catch (e) {
+    return;
+  }
+  if (animal !== CURRENT_ANIMAL) return;
+  document.getElementById('narrowing').textContent = result.count === 1
+    ? "You've narrowed it to 1 animal!"
+    : `You've narrowed it to ${result.count} animals`;
+}
+
+// Ask the server which cell would best tell the remaining animals apart
+// (hints.py) and put the cursor on it, without revealing it.
+async function showHint() {
+  const feedback = document.getElementById('guessFeedback');
+  const revealed = {};
+  for (const f of FEATURES) revealed[f] = encodePackedMap(userMaps[f]);
+  let hint;
+  try {
+    const resp = await fetch("/api/hint/" + encodeURIComponent(CURRENT_ANIMAL), {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ revealed })
+    });
+    if (!resp.ok) return;
+    hint = await resp.json();
+  } catch (e) {
+    return;
+  }
+
+  feedback.style.color = "#555";
+  if (!hint.cell) {
+    feedback.textContent = "No more hints: you can guess now!";
+    return;
+  }
+  const { feature, r, c } = hint.cell;
+  savedPositions[feature] = [r, c];
+  selectFeature(feature);
+  feedback.textContent = `Hint: try here on the ${feature} map (${hint.remaining} animals still possible)`;
+}
+
 function applyFilterAt(r, c) {
   // r,c are fm indices (0..FM_SIZE-1)
   const truth = HARDCODED_MAPS[selectedFeature][r][c]; // 0/1
   const color = truth ? 'red' : 'blue'; // 1->red, 0->blue (matches your Tkinter)
+  if (userMaps[selectedFeature][r][c] === null) {
+    queueReveal(CURRENT_ANIMAL, selectedFeature, r, c);
+  }
   userMaps[selectedFeature][r][c] = color;
   savedPositions[selectedFeature] = [r, c]; // update memory
   drawFeatureMap(selectedFeature);
@@ -337,8 +683,8 @@ function onCanvasClick(ev) {
   const y = ev.clientY - rect.top;
   const col = Math.floor(x / SCALE);
   const row = Math.floor(y / SCALE);
-  const fmCol = Math.floor(col / STRIDE);
-  const fmRow = Math.floor(row / STRIDE);
+  const fmCol = Math.floor((col + PADDING) / STRIDE);
+  const fmRow = Math.floor((row + PADDING) / STRIDE);
   if (fmRow < 0 || fmRow >= FM_SIZE || fmCol < 0 || fmCol >= FM_SIZE) return;
 
   cursorRow = fmRow; cursorCol = fmCol;
@@ -371,6 +717,7 @@ function onGuess() {
   const input = document.getElementById('guessInput');
   const feedback = document.getElementById('guessFeedback');
   const val = (input.value || "").trim().toLowerCase();
+  queueGuess(CURRENT_ANIMAL, val);
 
   if (val === CORRECT_WORD.toLowerCase()) {
     feedback.textContent = "Correct!";
@@ -381,6 +728,7 @@ function onGuess() {
     ANIMAL_GUESS_STATE[CURRENT_ANIMAL].guessText = val;
 
     revealImage();
+    showPipeline(CURRENT_ANIMAL);
   } else {
     feedback.textContent = "❌ Incorrect!";
     feedback.style.color = "red";
@@ -396,15 +744,146 @@ function revealImage() {
     imageRevealed = true;
     drawImagePatch();
   };
-  giraffeImage.onerror = () => {
+  useFallbackOnError(giraffeImage, () => {
     // fallback: keep black background and show message
     const fb = document.getElementById('guessFeedback');
     fb.textContent = '(unable to load giraffe image)';
     fb.style.color = 'orange';
-  };
+  });
   giraffeImage.src = GIRAFFE_URL;
 }
 
+// The main image is a small WebP; retry with the PNG variant if it can't be decoded
+function useFallbackOnError(img, onFinalError) {
+  img.onerror = () => {
+    if (GIRAFFE_FALLBACK_URL && !img.src.endsWith(GIRAFFE_FALLBACK_URL)) {
+      img.src = GIRAFFE_FALLBACK_URL;
+    } else if (onFinalError) {
+      onFinalError();
+    }
+  };
+}
+
+// --- the rest of the mini CNN (convcore.run_pipeline) ---
+// Once an animal is guessed, show what its feature maps become further into
+// the network: pooled, combined into "head" and "body", pooled again. The
+// server computes it once per animal (GET /api/pipeline/<key>).
+const PIPELINE_PX = 60;       // each channel is drawn this wide
+const pipelines = new Map();  // animal key -> response
+
+async function showPipeline(key) {
+  const box = document.getElementById("pipeline");
+  box.innerHTML = "";
+  let data = pipelines.get(key);
+  if (!data) {
+    try {
+      const resp = await fetch("/api/pipeline/" + encodeURIComponent(key));
+      if (!resp.ok) return;
+      data = await resp.json();
+    } catch (e) {
+      return;
+    }
+    pipelines.set(key, data);
+  }
+  if (key !== CURRENT_ANIMAL) return;   // switched animals meanwhile
+  box.innerHTML = "";
+  // The first layer is the feature maps, already on screen
+  for (const layer of data.layers.slice(1)) {
+    const title = document.createElement("h5");
+    title.textContent = `${layer.name} (${layer.shape.join("x")})`;
+    const row = document.createElement("div");
+    row.className = "pipeline-layer";
+    const top = Math.max(...layer.data.flat(2), 1e-6);
+    layer.data.forEach((channel, i) => {
+      const h = channel.length, w = channel[0].length;
+      const cell = Math.max(1, Math.floor(PIPELINE_PX / w));
+      const canvas = document.createElement("canvas");
+      canvas.width = w * cell;
+      canvas.height = h * cell;
+      const ctx = canvas.getContext("2d");
+      ctx.fillStyle = "#fff";
+      ctx.fillRect(0, 0, canvas.width, canvas.height);
+      for (let r = 0; r < h; r++) {
+        for (let c = 0; c < w; c++) {
+          // Stronger red for a stronger response, relative to the layer's largest
+          ctx.fillStyle = `rgba(255,0,0,${channel[r][c] / top})`;
+          ctx.fillRect(c * cell, r * cell, cell, cell);
+        }
+      }
+      const card = document.createElement("div");
+      card.className = "pipeline-channel";
+      card.appendChild(canvas);
+      card.appendChild(document.createTextNode(layer.channels[i]));
+      row.appendChild(card);
+    });
+    box.appendChild(title);
+    box.appendChild(row);
+  }
+}
+
+// --- filter animation ---
+// Streams /api/stream/<animal> (JSON lines: a header, then one feature-map
+// row at a time as the server computes it) and slides the filter across the
+// hidden image, shading each patch by whether the selected filter fired.
+const ANIMATE_STEP_MS = 60;
+let animating = false;
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function streamFeatureRows(url, onRow) {
+  const resp = await fetch(url);
+  if (!resp.ok || !resp.body) return;
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  let header = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buffered.indexOf("\n")) >= 0) {
+      const line = buffered.slice(0, nl);
+      buffered = buffered.slice(nl + 1);
+      if (!line) continue;
+      const doc = JSON.parse(line);
+      if (header === null) header = doc;
+      else await onRow(doc, header);
+    }
+  }
+}
+
+async function animateFilter() {
+  if (animating) return;
+  animating = true;
+  const feature = selectedFeature;
+  try {
+    await streamFeatureRows("/api/stream/" + CURRENT_ANIMAL, async (row) => {
+      const hits = row.hits[feature] || [];
+      for (let c = 0; c < hits.length; c++) {
+        drawImagePatch();
+        const top = (row.row * STRIDE - PADDING) * SCALE;
+        const left = (c * STRIDE - PADDING) * SCALE;
+        imgCtx.save();
+        imgCtx.fillStyle = hits[c] ? 'rgba(255,0,0,0.5)' : 'rgba(0,0,255,0.25)';
+        imgCtx.fillRect(left, top, FILTER_SIZE * SCALE, FILTER_SIZE * SCALE);
+        imgCtx.lineWidth = 3;
+        imgCtx.strokeStyle = 'yellow';
+        imgCtx.strokeRect(left + 2, top + 2, FILTER_SIZE * SCALE - 4, FILTER_SIZE * SCALE - 4);
+        imgCtx.restore();
+        await sleep(ANIMATE_STEP_MS);
+      }
+    });
+  } catch (e) {
+    // animation is a nice-to-have; leave the board as it was
+  } finally {
+    animating = false;
+    drawImagePatch();
+  }
+}
+
 // --- startup ---
 function init() {
   // build UI
@@ -420,30 +899,19 @@ function init() {
   imgCanvas.addEventListener('click', onCanvasClick);
   window.addEventListener('keydown', onKey);
   document.getElementById('guessBtn').addEventListener('click', onGuess);
+  document.getElementById('animateBtn').addEventListener('click', animateFilter);
+  document.getElementById('hintBtn').addEventListener('click', showHint);
 }
 
 
-window.addEventListener("load", () => {
-  init();
+window.addEventListener("pagehide", flushSync);
 
-  const buttons = document.querySelectorAll(".animal-btn");
-
-  // Set up click handlers
-  buttons.forEach(btn => {
-    btn.addEventListener("click", () => {
-      switchAnimal(btn.dataset.key);
-
-      // Remove active from all
-      buttons.forEach(b => b.classList.remove("active"));
-
-      // Add active to this button
-      btn.classList.add("active");
-    });
-  });
+window.addEventListener("load", async () => {
+  init();
+  await loadServerState();
+  await switchAnimal(CURRENT_ANIMAL);
 
-  const defaultBtn = document.querySelector(".animal-btn[data-key='animal1']");
-  if (defaultBtn) {
-    defaultBtn.classList.add("active");
-    switchAnimal("animal1");
-  }
-});
\ No newline at end of file
+  document.getElementById('animal-select').innerHTML = '';
+  await loadAnimalIndex(addAnimalButtons);
+  joinRoom();
+});
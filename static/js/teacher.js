@@ -0,0 +1,125 @@
+// teacher.js
+// Opens a live classroom room (rooms.py) and shows what the students reveal.
+// The server sends one snapshot, then a diff every tick; this file keeps the
+// room in memory and only repaints what a diff touched.
+
+const HEAT_SCALE = 14;   // px per feature-map cell
+
+let room = null;         // {features, size, heat: [Int32Array per feature], students: {id: [name, revealed, solved]}}
+let heatCanvases = [];
+
+function liveBaseUrl() {
+  if (LIVE_URL) return LIVE_URL;
+  return (location.protocol === "https:" ? "wss://" : "ws://") + location.hostname + ":8765";
+}
+
+async function loadAnimalChoices() {
+  const select = document.getElementById("animalChoice");
+  let url = "/api/animals";
+  while (url) {
+    const resp = await fetch(url);
+    if (!resp.ok) return;
+    const page = await resp.json();
+    for (const animal of page.animals) {
+      const option = document.createElement("option");
+      option.value = animal.key;
+      option.textContent = animal.display;
+      select.appendChild(option);
+    }
+    url = page.next;
+  }
+}
+
+function openRoom() {
+  const key = document.getElementById("animalChoice").value;
+  const socket = new WebSocket(liveBaseUrl() + "/teach?animal=" + encodeURIComponent(key));
+  const info = document.getElementById("roomInfo");
+  socket.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "snapshot") {
+      showSnapshot(msg);
+      const link = location.origin + "/?room=" + msg.code;
+      info.innerHTML = `Room <b>${msg.code}</b>: students open <a href="${link}">${link}</a>`;
+    } else if (msg.type === "diff") {
+      applyDiff(msg);
+    }
+  };
+  socket.onclose = () => {
+    info.textContent += " (closed)";
+  };
+  document.getElementById("openRoomBtn").disabled = true;
+}
+
+function showSnapshot(msg) {
+  room = {
+    features: msg.features,
+    size: msg.size,
+    heat: msg.features.map(f => Int32Array.from(msg.heat[f].flat())),
+    students: msg.students
+  };
+  const container = document.getElementById("heatmaps");
+  container.innerHTML = "";
+  heatCanvases = room.features.map(feature => {
+    const wrap = document.createElement("div");
+    wrap.className = "fm-card";
+    const label = document.createElement("div");
+    label.textContent = feature;
+    const canvas = document.createElement("canvas");
+    canvas.className = "fm-canvas";
+    canvas.width = canvas.height = room.size * HEAT_SCALE;
+    wrap.appendChild(label);
+    wrap.appendChild(canvas);
+    container.appendChild(wrap);
+    return canvas;
+  });
+  room.features.forEach((_, fi) => drawHeatmap(fi));
+  drawStudents();
+}
+
+function applyDiff(msg) {
+  if (!room) return;
+  const touched = new Set();
+  for (const [fi, cell, count] of msg.cells) {
+    room.heat[fi][cell] = count;
+    touched.add(fi);
+  }
+  // Colours are relative to the busiest cell of each map, so a map with a
+  // change is redrawn whole; it is only size*size rectangles
+  touched.forEach(drawHeatmap);
+  Object.assign(room.students, msg.students);
+  for (const id of msg.left) delete room.students[id];
+  if (Object.keys(msg.students).length || msg.left.length) drawStudents();
+}
+
+function drawHeatmap(fi) {
+  const ctx = heatCanvases[fi].getContext("2d");
+  const heat = room.heat[fi];
+  const max = Math.max(1, ...heat);
+  for (let i = 0; i < heat.length; i++) {
+    const r = Math.floor(i / room.size), c = i % room.size;
+    const level = heat[i] / max;
+    ctx.fillStyle = `rgba(200, 30, 30, ${0.08 + 0.92 * level})`;
+    ctx.clearRect(c * HEAT_SCALE, r * HEAT_SCALE, HEAT_SCALE, HEAT_SCALE);
+    ctx.fillRect(c * HEAT_SCALE, r * HEAT_SCALE, HEAT_SCALE - 1, HEAT_SCALE - 1);
+  }
+}
+
+function drawStudents() {
+  const entries = Object.entries(room.students);
+  const solved = entries.filter(([, s]) => s[2]).length;
+  document.getElementById("studentCount").textContent =
+    `Students: ${entries.length}, solved: ${solved}`;
+  const body = document.querySelector("#students tbody");
+  body.innerHTML = "";
+  for (const [id, [name, revealed, isSolved]] of entries) {
+    const row = body.insertRow();
+    row.insertCell().textContent = name || `Student ${id}`;
+    row.insertCell().textContent = `${revealed} cells`;
+    row.insertCell().textContent = isSolved ? "solved" : "";
+  }
+}
+
+window.addEventListener("load", async () => {
+  await loadAnimalChoices();
+  document.getElementById("openRoomBtn").addEventListener("click", openRoom);
+});
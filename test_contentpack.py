@@ -0,0 +1,58 @@
+"""Build a content pack from a fresh source folder and load it back.
+
+    python -m pytest test_contentpack.py
+"""
+import json
+import os
+
+from PIL import Image
+
+import bitmaps
+import contentpack
+from convcore import FEATURES, FM_SIZE
+from registry import AnimalRegistry
+
+
+def make_source(root):
+    """Two animals: one with maps.json, one with only an image (maps derived)."""
+    eye = [[0] * FM_SIZE for _ in range(FM_SIZE)]
+    eye[0][4] = eye[9][9] = 1
+    for key, name, maps in (("animal1", "giraffe", {"eye": eye}), ("animal2", "zebra", None)):
+        folder = os.path.join(root, key)
+        os.makedirs(folder)
+        with open(os.path.join(folder, "meta.json"), "w") as fh:
+            json.dump({"name": name, "display": key.title()}, fh)
+        img = Image.new("RGB", (60, 60), "white")
+        img.paste((0, 0, 0), (10, 10, 50, 50))
+        img.save(os.path.join(folder, "image.png"))
+        if maps is not None:
+            with open(os.path.join(folder, "maps.json"), "w") as fh:
+                json.dump(maps, fh)
+
+
+def test_build_then_load(tmp_path):
+    source = tmp_path / "content"
+    static = tmp_path / "static"        # no static/build yet, as in a fresh checkout
+    pack = str(tmp_path / "animals.pack")
+    make_source(source)
+
+    rebuilt, reused = contentpack.build_pack(str(source), pack, str(static), workers=1)
+    assert rebuilt == ["animal1", "animal2"] and reused == []
+
+    features, size, records = contentpack.read_pack(pack)
+    assert features == list(FEATURES) and size == FM_SIZE
+    assert [r["key"] for r in records] == ["animal1", "animal2"]
+    for rec in records:
+        assert os.path.exists(static / rec["webp"]) and os.path.exists(static / rec["png"])
+    assert bitmaps.map_to_array(records[0]["maps"]["eye"], FM_SIZE)[9, 9]
+
+    registry = AnimalRegistry(pack=pack)
+    assert registry.keys() == ["animal1", "animal2"]
+    giraffe = registry.get("animal1")
+    assert (giraffe.name, giraffe.display) == ("giraffe", "Animal1")
+    assert giraffe.maps == records[0]["maps"]
+    assert giraffe.variants == {"webp": records[0]["webp"], "png": records[0]["png"]}
+
+    # Nothing changed: nothing is rebuilt and the pack reads back the same
+    assert contentpack.build_pack(str(source), pack, str(static), workers=1) == ([], ["animal1", "animal2"])
+    assert contentpack.read_pack(pack) == (features, size, records)
@@ -0,0 +1,103 @@
+"""Recordings: write, read back and replay, in the current and the v1 layout.
+
+    python -m pytest test_recording.py
+"""
+import itertools
+import struct
+
+import recording
+from convcore import FEATURES
+from engine import GameEngine
+from registry import AnimalRegistry
+
+SIZE = 300      # big enough for image cells past 255
+
+
+def big_target(registry):
+    target = recording.EngineTarget(registry)
+    target.new_game = lambda animal: GameEngine(animal, size=SIZE)
+    return target
+
+
+def play(game, events):
+    """The events straight on an engine, for comparing with a replay."""
+    for _, op, args in events:
+        if op == recording.ANIMAL:
+            game.select_feature(game.features[0])
+        elif op == recording.FEATURE:
+            game.select_feature(*args)
+        elif op == recording.CLICK:
+            game.click(*args)
+        elif op in recording.MOVES:
+            game.move(*recording.MOVES[op])
+        elif op == recording.GUESS:
+            game.check_guess(*args)
+    return game
+
+
+def test_record_read_replay(tmp_path):
+    path = str(tmp_path / "lesson.garc")
+    ticks = itertools.count()
+    rec = recording.Recorder(path, clock=lambda: next(ticks) * 0.25)
+    rec.animal("animal1")
+    rec.feature("ear")
+    rec.click(2, 3)
+    rec.click(800, 299)         # row 266, col 99 on the feature map
+    rec.move(0, 1)
+    rec.feature("eye")
+    rec.click(127, 128)         # either side of the 1-byte varint limit
+    rec.move(1, 0)
+    rec.guess("Giraffe")
+    rec.close()
+
+    header, events = recording.read_recording(path)
+    assert header["features"] == list(FEATURES)
+    assert [(op, args) for _, op, args in events] == [
+        (recording.ANIMAL, ("animal1",)), (recording.FEATURE, ("ear",)),
+        (recording.CLICK, (2, 3)), (recording.CLICK, (800, 299)), (recording.RIGHT, ()),
+        (recording.FEATURE, ("eye",)), (recording.CLICK, (127, 128)), (recording.DOWN, ()),
+        (recording.GUESS, ("Giraffe",)),
+    ]
+    assert [t for t, _, _ in events] == [0.25 * i for i in range(1, 10)]
+
+    registry = AnimalRegistry()
+    target = big_target(registry)
+    recording.replay(events, target)
+    expected = play(GameEngine(registry.get("animal1"), size=SIZE), events)
+    game = target.game
+    assert game.cells == expected.cells
+    assert game.saved == expected.saved
+    assert game.saved[FEATURES.index("ear")] == (266, 100)
+    assert (game.correct, game.guess) == (True, "giraffe")
+
+    # A cut-off last event is dropped, the rest still reads
+    with open(path, "rb") as fh:
+        data = fh.read()
+    with open(path, "wb") as fh:
+        fh.write(data[:-3])
+    assert recording.read_recording(path)[1] == events[:-1]
+
+
+def test_read_version_1(tmp_path):
+    # v1: clicks were u8 row, u8 col
+    data = bytearray(recording.MAGIC) + struct.pack("<HQB", 1, 1_700_000_000_000, 2)
+    for f in ("eye", "ear"):
+        data += struct.pack("<H", len(f)) + f.encode()
+    data += bytes([recording.ANIMAL, 5]) + struct.pack("<H", 7) + b"animal1"
+    data += bytes([recording.FEATURE, 10, 1])
+    data += bytes([recording.CLICK, 0x80 | 10, 1, 200, 27])     # 138 ms, row 200, col 27
+    data += bytes([recording.LEFT, 3])
+    path = tmp_path / "old.garc"
+    path.write_bytes(bytes(data))
+
+    header, events = recording.read_recording(str(path))
+    assert header == {"start": 1_700_000_000, "features": ["eye", "ear"]}
+    assert events == [(0.005, recording.ANIMAL, ("animal1",)), (0.015, recording.FEATURE, ("ear",)),
+                      (0.153, recording.CLICK, (200, 27)), (0.156, recording.LEFT, ())]
+
+    registry = AnimalRegistry()
+    target = big_target(registry)
+    recording.replay(events, target)
+    expected = play(GameEngine(registry.get("animal1"), size=SIZE), events)
+    assert target.game.cells == expected.cells
+    assert target.game.saved[FEATURES.index("ear")] == (66, 8)
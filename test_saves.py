@@ -0,0 +1,62 @@
+"""Saved games: the current u16 cursor positions and saves from before them.
+
+    python -m pytest test_saves.py
+"""
+from engine import BLUE, HIDDEN, NO_POSITION, RED, GameEngine
+from saves import SaveStore
+
+
+class Animal:
+    key = "big"
+    name = "Zebra"
+    signature = (1,)
+
+    def __init__(self, maps):
+        self.maps = maps
+
+
+def test_u16_save_round_trip(tmp_path):
+    # A 300x300 board: rows and columns past 255 need the u16 positions
+    animal = Animal({"eye": 1 << (299 * 300 + 257)})
+    game = GameEngine(animal, size=300)
+    game.select_feature("eye")
+    game.reveal_at(299, 257)
+    game.place_cursor("leg", 256, 3)
+    game.check_guess(" zebra ")
+
+    store = SaveStore(str(tmp_path / "saves.sqlite3"))
+    store.save("maya", animal.key, {animal.key: game})
+    last, games = store.load("maya")
+    store.close()
+    assert last == "big"
+
+    restored = GameEngine(animal, size=300)
+    restored.restore_state(*games["big"])
+    assert restored.cells == game.cells
+    assert restored.state("eye", 299, 257) == RED
+    assert restored.saved == game.saved
+    assert restored.saved[game.features.index("leg")] == (256, 3)
+    assert restored.saved[game.features.index("ear")] is None
+    assert (restored.correct, restored.guess) == (True, "zebra")
+    assert len(games["big"][1]) == 4 * len(game.features)
+
+
+def test_legacy_u8_save():
+    animal = Animal({"eye": 1 << 34})
+    game = GameEngine(animal)
+    game.select_feature("eye")
+    game.reveal_at(3, 4)
+    game.reveal_at(5, 5)
+    cells = game.save_state()[0]
+    # Before u16: u8 row, col per feature, 255 for a map the cursor was never on
+    positions = bytes([5, 5] + [255, 255] * (len(game.features) - 1))
+
+    restored = GameEngine(animal)
+    restored.restore_state(cells, positions, 0, "")
+    assert restored.saved == [(5, 5)] + [None] * (len(game.features) - 1)
+    assert (restored.row, restored.col) == (5, 5)
+    assert restored.state("eye", 3, 4) == RED
+    assert restored.state("eye", 5, 5) == BLUE
+    assert restored.state("ear", 0, 0) == HIDDEN
+    # and it saves back in the new layout
+    assert restored.save_state()[1][4:] == NO_POSITION.to_bytes(2, "little") * (2 * len(game.features) - 2)
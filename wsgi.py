@@ -0,0 +1,20 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py          # see gunicorn.conf.py for the knobs
+
+gunicorn.conf.py sets preload_app, so the master process imports this module
+once before forking: every animal is loaded, the play statistics read and the
+index page rendered here, and the workers share that memory copy-on-write
+instead of each building their own.
+"""
+import gc
+
+from app import app, registry, warm_up
+
+for key in registry.keys():
+    registry.get(key)
+warm_up()
+
+# Move everything loaded so far out of the garbage collector's reach, so a
+# collection in a worker doesn't touch (and so copy) the shared pages
+gc.freeze()